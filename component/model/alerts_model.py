@@ -68,6 +68,18 @@ class SelectedAlertsModel(model.Model):
     received_alerts = Any(None).tag(sync=True)
     "Variable used to indicate that alerts in json format where received"
 
+    alerts_page_bbs = Any(None).tag(sync=True)
+    "Last page of bounding boxes received while all the alerts are extracted page by page, appended to the analyzed alerts"
+
+    alert_hotspots = Any(None).tag(sync=True)
+    "List of GeoJSON grid cells with the alert area and latest date of the filtered alerts"
+
+    extraction_params = Any(None).tag(sync=True)
+    "Dictionary of the parameters used to extract the alerts, used to extract the alerts of a hotspot cell"
+
+    extraction_generation = Int(0).tag(sync=True)
+    "Counter increased at each new alert extraction, results of an older extraction are dropped. Not reset with the model"
+
     def export_dictionary(self):
         dictionary = {
             "selected_alert_sources": self.selected_alert_sources,
@@ -90,4 +102,7 @@ class SelectedAlertsModel(model.Model):
         self.filtered_alert_raster = None
         self.alerts_total_bbs = None
         self.alerts_bbs = None
+        self.alerts_page_bbs = None
         self.received_alerts = None
+        self.alert_hotspots = None
+        self.extraction_params = None
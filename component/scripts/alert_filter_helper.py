@@ -1,15 +1,31 @@
-import time
-import json
+import random
 import ee
-import ast
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
 import pandas as pd
 import geopandas as gpd
-from datetime import date, datetime
-from math import floor, ceil
+import shapely
+from datetime import datetime, timedelta
+from math import floor, ceil, sqrt
 from component.message import cm
-from shapely.geometry import Point, Polygon
+from shapely.geometry import Point, shape
 from sepal_ui.scripts import utils as su
-from component.scripts.report_builder import get_unique_alerts, format_list
+from component.scripts.report_builder import (
+    ALERT_SOURCE_BITS,
+    ALERT_SOURCE_DIGITS,
+    encode_alert_sources,
+)
+from component.scripts.alert_vectorize_helper import (
+    merge_alert_tiles,
+    summarize_alert_tile,
+)
+from component.scripts.ee_helper import (
+    DEFAULT_RETRY_POLICY,
+    SPLITTABLE_ERRORS,
+    evaluate_with_retry,
+    is_splittable_error,
+)
+
 
 def check_integer(text, exception_text):
     try:
@@ -56,329 +72,510 @@ def check_alert_filter_inputs(self):
     )
 
 
-def evaluate_with_retry(ee_object, max_retries=5, delay=3):
+def apply_distinct(fc, property_name, new_property_name):
     """
-    Evaluates a Google Earth Engine object and retries if a computation times out.
+    Apply distinct to a list property in each feature of a FeatureCollection.
 
     Args:
-        ee_object: The Earth Engine object to evaluate (e.g., a FeatureCollection or Image).
-        max_retries: Maximum number of retries if a computation times out.
-        delay: Delay (in seconds) between retries.
+        fc (ee.FeatureCollection): The input FeatureCollection.
+        property_name (str): The name of the property containing the list.
+        new_property_name (str): The name of the new property to store the distinct list.
 
     Returns:
-        The result of the computation as a JSON object.
-
-    Raises:
-        Exception: If all retries fail, the exception from the last attempt is raised.
+        ee.FeatureCollection: A new FeatureCollection with distinct values in the new property.
     """
-    attempt = 0
-    while attempt < max_retries:
-        try:
-            # Evaluate the Earth Engine object
-            return ee_object.getInfo()
-        except ee.ee_exception.EEException as e:
-            # Check if the exception is a timeout
-            if "Computation timed out" in str(e):
-                attempt += 1
-                print(
-                    f"Attempt {attempt} failed due to timeout. Retrying in {delay} seconds..."
-                )
-                time.sleep(delay)
-            else:
-                # Re-raise the exception if it's not a timeout
-                raise
-    raise Exception(f"All {max_retries} attempts failed due to timeout.")
+    # Features reduced with the compact reducer have no list to collapse
+    fc2 = fc.map(
+        lambda feature: ee.Feature(
+            ee.Algorithms.If(
+                feature.propertyNames().contains(property_name),
+                feature.set(
+                    new_property_name, ee.List(feature.get(property_name)).distinct()
+                ),
+                feature,
+            )
+        )
+    )
+    return fc2.map(
+        lambda feature: ee.Feature(feature.geometry()).copyProperties(
+            source=feature, exclude=[property_name]
+        )
+    )
 
 
-def custom_reduce_image_collection(image_collection):
+def create_alert_source_band(alert):
     """
-    Reduces an ee.ImageCollection with custom reducers for specific bands.
+    Encode the alert band as a bitmask of the alert sources of each pixel.
+
+    The bits are the ones of the alert_source_mask column (see encode_alert_sources),
+    so clusters can be summarized with a bitwise OR instead of a list of pixel values.
 
     Args:
-        image_collection (ee.ImageCollection): The input ImageCollection containing 'alerts' and 'date' bands.
+        alert (ee.Image): The alert band, built by summing the alert source digits.
 
     Returns:
-        ee.Image: A single reduced image with the max of 'alerts' and min of 'date'.
+        ee.Image: The "alert_source" integer band.
     """
-    # Define reducers for the bands
-    sum_alerts_reducer = ee.Reducer.sum()
-    min_date_reducer = ee.Reducer.min()
+    alert = ee.Image(alert).toInt()
+    alert_source = ee.Image(0)
+    for name, digit in ALERT_SOURCE_DIGITS.items():
+        source_digit = alert.divide(digit).floor().mod(10)
+        triggered = source_digit.gte(1).And(source_digit.lte(2))
+        alert_source = alert_source.bitwiseOr(
+            triggered.multiply(ALERT_SOURCE_BITS[name])
+        )
+    return alert_source.toInt().updateMask(alert.mask()).rename("alert_source")
 
-    # Apply the reducers to the ImageCollection
-    reduced_alerts = image_collection.select("alert").reduce(sum_alerts_reducer)
-    reduced_date = image_collection.select("date").reduce(min_date_reducer)
 
-    # Combine the reduced results into a single image
-    combined_image = reduced_alerts.rename("alert").addBands(
-        reduced_date.rename("date")
+def create_alert_reducer(compact=True):
+    """
+    Create the reducer applied to each alert cluster by reduceToVectors.
+
+    The compact reducer expects the "alert_source" band of create_alert_source_band
+    and returns a single alert_source_mask integer per cluster. The list reducer
+    expects the raw "alert" band and returns alert_type_list, with one item per pixel.
+
+    Args:
+        compact (bool): Use the bitwise OR reducer instead of the list reducer.
+
+    Returns:
+        ee.Reducer: count, alert source summary and alert_date_min/max reducer.
+    """
+    if compact:
+        alert_type_reducer = ee.Reducer.bitwiseOr().setOutputs(["mask"])
+        alert_type_prefix = "alert_source_"
+    else:
+        alert_type_reducer = ee.Reducer.toList()
+        alert_type_prefix = "alert_type_"
+
+    return (
+        ee.Reducer.count()
+        .combine(alert_type_reducer.unweighted(), alert_type_prefix)
+        .combine(ee.Reducer.minMax().unweighted(), "alert_date_")
     )
 
-    return combined_image
 
+def get_sorting_key(sorting):
+    """
+    Return the property and order used by an alert sorting method.
 
-def obtener_datos_gee_parcial_map(
-    aoi,
-    alert_raster,
-    ee_reducer,
-    pixel_size,
-    min_alert_size_pixels,
-    max_elementos,
-    sorting,
-    grid_size,
-    max_retries=3,
-):
-    def get_bb(feature):
-        grid_geometry = ee.Feature(feature).geometry()
-        bounding_boxes = alert_raster.clip(grid_geometry).reduceToVectors(
-            reducer=ee_reducer,
-            geometry=grid_geometry,
-            scale=pixel_size,
-            geometryType="bb",
-            eightConnected=True,
-            maxPixels=1e13,
-        )
+    Args:
+        sorting (str): One of the cm.filter_tile.alert_sorting_method_label* values.
 
-        # Filter clusters with at least `min_alert_size_pixels`
-        bb_cleaned = bounding_boxes.filter(
-            ee.Filter.gte("count", min_alert_size_pixels)
-        )
-        return bb_cleaned
+    Returns:
+        tuple: (property_name, ascending)
+    """
+    sorting_keys = {
+        cm.filter_tile.alert_sorting_method_label1: ("count", False),
+        cm.filter_tile.alert_sorting_method_label2: ("count", True),
+        cm.filter_tile.alert_sorting_method_label3: ("alert_date_max", False),
+        cm.filter_tile.alert_sorting_method_label4: ("alert_date_max", True),
+    }
+    return sorting_keys[sorting]
 
-    def procesar_elemento(elemento):
-        bb = get_bb(elemento)
-        conteo = bb.size()  # Keep this as an EE object
 
-        # Only fetch info if we have elements
-        return ee.Algorithms.If(conteo.gte(1), bb, ee.FeatureCollection([]))
+def sort_bounding_boxes(fc, sorting):
+    """Sort a bounding box FeatureCollection on the EE side."""
+    property_name, ascending = get_sorting_key(sorting)
+    return fc.sort(property_name, ascending)
 
-    # Function to apply distinct to the 'list' property of each feature
-    def apply_distinct(fc, property_name, new_property_name):
-        """
-        Apply distinct to a list property in each feature of a FeatureCollection.
 
-        Args:
-            fc (ee.FeatureCollection): The input FeatureCollection.
-            property_name (str): The name of the property containing the list.
-            new_property_name (str): The name of the new property to store the distinct list.
+# Number of alerts returned when the user doesn't set a maximum
+DEFAULT_MAX_ALERTS = 5000
 
-        Returns:
-            ee.FeatureCollection: A new FeatureCollection with distinct values in the new property.
-        """
-        fc2 = fc.map(
-            lambda feature: feature.set(
-                new_property_name, ee.List(feature.get(property_name)).distinct()
-            )
+
+def get_max_features(max_elementos):
+    """Return the number of alerts to keep, None to keep all of them."""
+    if max_elementos is None:
+        return None
+    return DEFAULT_MAX_ALERTS if max_elementos <= 0 else int(max_elementos)
+
+
+def sort_features(features, sorting):
+    """Sort a list of bounding box features (as returned by getInfo) on the client side."""
+    property_name, ascending = get_sorting_key(sorting)
+    return sorted(
+        features,
+        key=lambda feature: feature["properties"][property_name],
+        reverse=not ascending,
+    )
+
+
+# Properties returned for each bounding box, the others reducer outputs are dropped
+ALERT_PROPERTIES = [
+    "count",
+    "alert_date_min",
+    "alert_date_max",
+    "alert_source_mask",
+    "alert_type_unique",
+]
+
+
+def project_bounding_boxes(fc, sorting, properties=None, precision=6):
+    """
+    Keep only the needed properties of the bounding boxes and compact their geometry.
+
+    Each box is returned without geometry and with a "bbox" property holding its
+    [xmin, ymin, xmax, ymax] bounds instead of a 5 vertices ring, which cuts the
+    size of the getInfo response. The sorting property is always kept.
+
+    Args:
+        fc (ee.FeatureCollection): The bounding boxes.
+        sorting (str): Alert sorting method label.
+        properties (list): Names of the properties to return, ALERT_PROPERTIES by default.
+        precision (int): Number of decimals of the bbox coordinates, None to keep
+            full precision.
+
+    Returns:
+        ee.FeatureCollection: The projected bounding boxes, in the same order.
+    """
+    properties = list(ALERT_PROPERTIES if properties is None else properties)
+    sorting_property, _ = get_sorting_key(sorting)
+    if sorting_property not in properties:
+        properties.append(sorting_property)
+
+    def project(feature):
+        ring = ee.Array(feature.geometry().bounds(1).coordinates().get(0))
+        bbox = ring.reduce(ee.Reducer.min(), [0]).cat(
+            ring.reduce(ee.Reducer.max(), [0]), 1
         )
-        return fc2.map(
-            lambda feature: ee.Feature(feature.geometry()).copyProperties(
-                source=feature, exclude=[property_name]
-            )
+        if precision is not None:
+            factor = 10**precision
+            bbox = bbox.multiply(factor).round().divide(factor)
+        # select keeps the feature id, the properties missing in the feature are skipped
+        return feature.select(properties, None, False).set(
+            "bbox", bbox.project([1]).toList()
         )
 
-    # Use `map()` to batch-process elements in `aoi_grid`, limiting to `max_elementos`
-    if max_elementos == 0 or max_elementos > 30:
-        max_elementos = 30
-    else:
-        max_elementos = max_elementos
+    return fc.map(project)
 
-    aoi_grid = aoi.geometry().coveringGrid("EPSG:4326", grid_size)
-    aoi_grid_size = aoi_grid.size().getInfo()
-    
-    # Initial limit value and increment step
-    limit_value = 40
-    increment_step = 20
-
-    while True:
-        # Ensure limit_value does not exceed total_elements
-        if limit_value > aoi_grid_size:
-            limit_value = aoi_grid_size
-    
-        elementos_filtrados = aoi_grid.limit(limit_value).map(procesar_elemento)
-        resultados_pre = ee.FeatureCollection(elementos_filtrados).flatten()
-    
-        # Get the number of elements in the FeatureCollection
-        num_elements = resultados_pre.size().getInfo()
-        #print(f"Quick run found {num_elements} alerts, with {limit_value}/{aoi_grid_size} cells")
-
-        if num_elements >= max_elementos or limit_value == aoi_grid_size:
-            resultados = resultados_pre
-            break
-            
-        # Increase the limit value by the increment step and try again
-        limit_value += increment_step
 
-    resultados2 = apply_distinct(resultados, "alert_type_list", "alert_type_unique")
-    
-    # Sort and convert to list
-    if sorting == cm.filter_tile.alert_sorting_method_label1:
-        bb_sorted = resultados2.sort("count", False)
-    if sorting == cm.filter_tile.alert_sorting_method_label2:
-        bb_sorted = resultados2.sort("count", True)
-    if sorting == cm.filter_tile.alert_sorting_method_label3:
-        bb_sorted = resultados2.sort("alert_date_max", False)
-    if sorting == cm.filter_tile.alert_sorting_method_label4:
-        bb_sorted = resultados2.sort("alert_date_max", True)
+def ring_to_bounds(ring):
+    """Return the [xmin, ymin, xmax, ymax] bounds of a list of [x, y] points."""
+    xs = [point[0] for point in ring]
+    ys = [point[1] for point in ring]
+    return [min(xs), min(ys), max(xs), max(ys)]
 
-    resultados3 = bb_sorted.toList(max_elementos)
 
-    return evaluate_with_retry(resultados3, max_retries)
+def get_geometry_bounds(geometry):
+    """Return the [xmin, ymin, xmax, ymax] bounds of an ee.Geometry in EPSG:4326."""
+    return ring_to_bounds(evaluate_with_retry(geometry.bounds(1).coordinates())[0])
 
 
-def obtener_datos_gee_total_v2(
-    aoi,
+def split_bounds(bounds):
+    """Split [xmin, ymin, xmax, ymax] bounds into 4 quadrants."""
+    xmin, ymin, xmax, ymax = bounds
+    xmid = (xmin + xmax) / 2
+    ymid = (ymin + ymax) / 2
+    return [
+        [xmin, ymid, xmid, ymax],
+        [xmid, ymid, xmax, ymax],
+        [xmin, ymin, xmid, ymid],
+        [xmid, ymin, xmax, ymid],
+    ]
+
+
+def get_cell_bounding_boxes(
+    cell_geometry,
     alert_raster,
     ee_reducer,
     pixel_size,
     min_alert_size_pixels,
-    max_elementos,
-    sorting,
+    max_pixels=1e13,
+    keep_edge_clusters=False,
+    keep_filter=None,
 ):
-    # Apply reducer and filter to minimum alert size
-    bounding_boxes = alert_raster.reduceToVectors(
+    """
+    Vectorize the alert clusters of a single cell as bounding boxes.
+
+    Args:
+        cell_geometry (ee.Geometry): The region to vectorize.
+        alert_raster (ee.Image): Image with the bands expected by ee_reducer.
+        ee_reducer (ee.Reducer): Reducer applied to each cluster.
+        pixel_size (int): Scale of the vectorization in meters.
+        min_alert_size_pixels (int): Minimum number of pixels of a cluster.
+        max_pixels (float): Pixel budget of the request, EE raises "Too many pixels" above it.
+        keep_edge_clusters (bool): Keep the clusters touching the cell edge whatever
+            their size, so their parts can be merged by merge_seam_bounding_boxes.
+        keep_filter (ee.Filter): Other clusters kept whatever their size, None for
+            none.
+
+    Returns:
+        ee.FeatureCollection: The bounding boxes with distinct alert types.
+    """
+    bounding_boxes = alert_raster.clip(cell_geometry).reduceToVectors(
         reducer=ee_reducer,
-        geometry=aoi,
+        geometry=cell_geometry,
         scale=pixel_size,
         geometryType="bb",
         eightConnected=True,
-        maxPixels=1e13,
-    ).filter(ee.Filter.gte("count", min_alert_size_pixels))
-
-    # Function to apply distinct to the 'list' property of each feature
-    def apply_distinct(fc, property_name, new_property_name):
-        """
-        Apply distinct to a list property in each feature of a FeatureCollection.
-
-        Args:
-            fc (ee.FeatureCollection): The input FeatureCollection.
-            property_name (str): The name of the property containing the list.
-            new_property_name (str): The name of the new property to store the distinct list.
-
-        Returns:
-            ee.FeatureCollection: A new FeatureCollection with distinct values in the new property.
-        """
-        fc2 = fc.map(
+        maxPixels=max_pixels,
+    )
+    size_filter = ee.Filter.gte("count", min_alert_size_pixels)
+    if keep_filter is not None:
+        size_filter = ee.Filter.Or(size_filter, keep_filter)
+    if keep_edge_clusters:
+        inner_cell = cell_geometry.buffer(-2 * pixel_size, 1)
+        bounding_boxes = bounding_boxes.map(
             lambda feature: feature.set(
-                new_property_name, ee.List(feature.get(property_name)).distinct()
-            )
-        )
-        return fc2.map(
-            lambda feature: ee.Feature(feature.geometry()).copyProperties(
-                source=feature, exclude=[property_name]
+                "inside_cell", feature.geometry().containedIn(inner_cell, 1)
             )
         )
+        size_filter = ee.Filter.Or(size_filter, ee.Filter.eq("inside_cell", False))
+    bounding_boxes = bounding_boxes.filter(size_filter)
+    return apply_distinct(bounding_boxes, "alert_type_list", "alert_type_unique")
+
+
+def get_feature_bounds(feature):
+    """Return the [xmin, ymin, xmax, ymax] bounds of a bounding box feature."""
+    if "bbox" in feature["properties"]:
+        return feature["properties"]["bbox"]
+    return ring_to_bounds(feature["geometry"]["coordinates"][0])
 
-    bounding_boxes_2 = apply_distinct(
-        bounding_boxes, "alert_type_list", "alert_type_unique"
+
+def merge_bounding_box_properties(features):
+    """Merge the properties of the parts of a cluster into a single feature."""
+    merged = dict(features[0]["properties"])
+    merged["count"] = sum(feature["properties"]["count"] for feature in features)
+    merged["alert_date_min"] = min(
+        feature["properties"]["alert_date_min"] for feature in features
+    )
+    merged["alert_date_max"] = max(
+        feature["properties"]["alert_date_max"] for feature in features
     )
+    if "alert_source_mask" in merged:
+        merged["alert_source_mask"] = 0
+        for feature in features:
+            merged["alert_source_mask"] |= feature["properties"]["alert_source_mask"]
+    if "alert_type_unique" in merged:
+        merged["alert_type_unique"] = sorted(
+            {
+                value
+                for feature in features
+                for value in feature["properties"]["alert_type_unique"]
+            }
+        )
+    bounds = np.array([get_feature_bounds(feature) for feature in features])
+    merged["bbox"] = [
+        *bounds[:, :2].min(axis=0).tolist(),
+        *bounds[:, 2:].max(axis=0).tolist(),
+    ]
+    return {
+        "type": "Feature",
+        "id": features[0]["id"],
+        "geometry": None,
+        "properties": merged,
+    }
+
+
+def merge_bounding_box_pairs(features, pairs):
+    """
+    Merge the features linked by pairs into clusters, with a union-find.
 
-    # Calculate the export limit on GEE side
-    max_elements = ee.Number(5000) if max_elementos <= 0 else ee.Number(max_elementos)
-    num_elements = bounding_boxes_2.size().min(max_elements)
+    Args:
+        features (list): Bounding box features.
+        pairs (np.ndarray): (2, m) array of indices of features of a same cluster.
 
-    # Sort and convert to list
-    if sorting == cm.filter_tile.alert_sorting_method_label1:
-        bb_sorted = bounding_boxes_2.sort("count", False)
-    if sorting == cm.filter_tile.alert_sorting_method_label2:
-        bb_sorted = bounding_boxes_2.sort("count", True)
-    if sorting == cm.filter_tile.alert_sorting_method_label3:
-        bb_sorted = bounding_boxes_2.sort("alert_date_max", False)
-    if sorting == cm.filter_tile.alert_sorting_method_label4:
-        bb_sorted = bounding_boxes_2.sort("alert_date_max", True)
+    Returns:
+        list: One feature per cluster.
+    """
+    parents = list(range(len(features)))
 
-    sorted_bb_list = bb_sorted.toList(num_elements)
+    def find_root(node):
+        while parents[node] != node:
+            parents[node] = parents[parents[node]]
+            node = parents[node]
+        return node
 
-    return sorted_bb_list
+    for i, j in np.asarray(pairs).T.tolist():
+        root_i, root_j = find_root(i), find_root(j)
+        if root_i != root_j:
+            parents[max(root_i, root_j)] = min(root_i, root_j)
 
+    clusters = {}
+    for i in range(len(features)):
+        clusters.setdefault(find_root(i), []).append(features[i])
 
-def obtener_datos_gee_parcial_map_2(
-    aoi,
-    alert_raster,
-    ee_reducer,
-    pixel_size,
-    min_alert_size_pixels,
-    max_elementos,
-    sorting,
-    grid_size,
-):
-    def get_bb(feature):
-        grid_geometry = ee.Feature(feature).geometry()
-        bounding_boxes = alert_raster.clip(grid_geometry).reduceToVectors(
-            reducer=ee_reducer,
-            geometry=grid_geometry,
-            scale=pixel_size,
-            geometryType="bb",
-            eightConnected=True,
-            maxPixels=1e13,
-        )
+    return [
+        parts[0] if len(parts) == 1 else merge_bounding_box_properties(parts)
+        for parts in clusters.values()
+    ]
+
+
+def merge_seam_bounding_boxes(features, cells, pixel_size, min_alert_size_pixels=0):
+    """
+    Merge the bounding boxes of the clusters cut by the edges of grid cells.
+
+    Boxes are paired with a shapely STRtree. Two boxes are parts of the same
+    cluster when they face each other on both sides of a cell edge and overlap
+    along it. The parts of a cluster are merged into one feature (count summed,
+    dates min/max, alert sources combined) and the size filter is applied after
+    the merge.
+
+    Args:
+        features (list): Bounding box features extracted cell by cell.
+        cells (list): [xmin, ymin, xmax, ymax] bounds of the extracted cells.
+        pixel_size (int): Scale of the vectorization in meters.
+        min_alert_size_pixels (int): Minimum number of pixels of a merged cluster.
 
-        # Filter clusters with at least `min_alert_size_pixels`
-        bb_cleaned = bounding_boxes.filter(
-            ee.Filter.gte("count", min_alert_size_pixels)
+    Returns:
+        list: The merged bounding box features, in no particular order.
+    """
+    if not features:
+        return []
+
+    # Boxes are cut on the pixel edge closest to the cell edge
+    tolerance = 1.5 * pixel_size / 111320
+    bounds = np.array(
+        [get_feature_bounds(feature) for feature in features], dtype=float
+    )
+    cells = np.array(cells, dtype=float).reshape(-1, 4)
+    seams_x = np.unique(cells[:, [0, 2]])
+    seams_y = np.unique(cells[:, [1, 3]])
+
+    tree = shapely.STRtree(shapely.box(*bounds.T))
+    first, second = tree.query(
+        shapely.box(*(bounds + [-tolerance, -tolerance, tolerance, tolerance]).T),
+        predicate="intersects",
+    )
+    keep = first < second
+    a, b = bounds[first[keep]], bounds[second[keep]]
+
+    def on_seam(values, seams):
+        if len(seams) == 0:
+            return np.zeros(len(values), dtype=bool)
+        return np.abs(values[:, None] - seams[None, :]).min(axis=1) <= tolerance
+
+    def faces(low, high, seams):
+        # the high edge of a box meets the low edge of the other one on a seam
+        return (
+            (np.abs(high - low) <= tolerance)
+            & on_seam(high, seams)
+            & on_seam(low, seams)
         )
-        return bb_cleaned
 
-    def procesar_elemento(elemento):
-        bb = get_bb(elemento)
-        conteo = bb.size()  # Keep this as an EE object
+    overlap_y = (
+        np.minimum(a[:, 3], b[:, 3]) - np.maximum(a[:, 1], b[:, 1]) >= -tolerance
+    )
+    overlap_x = (
+        np.minimum(a[:, 2], b[:, 2]) - np.maximum(a[:, 0], b[:, 0]) >= -tolerance
+    )
+    across_x = overlap_y & (
+        faces(b[:, 0], a[:, 2], seams_x) | faces(a[:, 0], b[:, 2], seams_x)
+    )
+    across_y = overlap_x & (
+        faces(b[:, 1], a[:, 3], seams_y) | faces(a[:, 1], b[:, 3], seams_y)
+    )
+    seam_pairs = np.stack([first[keep], second[keep]])[:, across_x | across_y]
+
+    merged = merge_bounding_box_pairs(features, seam_pairs)
+    if len(merged) < len(features):
+        print(f"Merged {len(features)} boxes into {len(merged)} across cell edges")
+    return [
+        feature
+        for feature in merged
+        if feature["properties"]["count"] >= min_alert_size_pixels
+    ]
 
-        # Only fetch info if we have elements
-        return ee.Algorithms.If(conteo.gte(1), bb, ee.FeatureCollection([]))
 
-    aoi_grid = aoi.geometry().coveringGrid("EPSG:4326", grid_size)
+def run_cells_concurrently(cells, cell_function, max_workers=8):
+    """
+    Run a function on each cell from a bounded pool of threads.
 
-    elementos_filtrados = aoi_grid.map(procesar_elemento)
+    Each call is a separate EE request so a slow or failing cell does not block
+    the others.
 
-    # Convert the resulting list of lists to a flat list
-    resultados = ee.FeatureCollection(elementos_filtrados).flatten()
+    Args:
+        cells (list): The cells to process.
+        cell_function (callable): Function called with a single cell.
+        max_workers (int): Maximum number of requests running at the same time.
 
-    # Function to apply distinct to the 'list' property of each feature
-    def apply_distinct(fc, property_name, new_property_name):
-        """
-        Apply distinct to a list property in each feature of a FeatureCollection.
+    Returns:
+        list: (cell, result, error) tuples in completion order, error is None on success.
+    """
+    outputs = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(cell_function, cell): cell for cell in cells}
+        for future in as_completed(futures):
+            try:
+                outputs.append((futures[future], future.result(), None))
+            except Exception as e:
+                outputs.append((futures[future], None, e))
+    return outputs
 
-        Args:
-            fc (ee.FeatureCollection): The input FeatureCollection.
-            property_name (str): The name of the property containing the list.
-            new_property_name (str): The name of the new property to store the distinct list.
 
-        Returns:
-            ee.FeatureCollection: A new FeatureCollection with distinct values in the new property.
-        """
-        fc2 = fc.map(
-            lambda feature: feature.set(
-                new_property_name, ee.List(feature.get(property_name)).distinct()
-            )
-        )
-        return fc2.map(
-            lambda feature: ee.Feature(feature.geometry()).copyProperties(
-                source=feature, exclude=[property_name]
-            )
-        )
+# Date ranges longer than this can be extracted in windows of TEMPORAL_WINDOW_MONTHS
+TEMPORAL_SHARDING_MIN_DAYS = 366
+TEMPORAL_WINDOW_MONTHS = 3
+# Clusters with alerts closer than this to a window edge are kept whatever their size
+TEMPORAL_EDGE_DAYS = 30
 
-    resultados2 = apply_distinct(resultados, "alert_type_list", "alert_type_unique")
 
-    # Sort and convert to list
-    if sorting == cm.filter_tile.alert_sorting_method_label1:
-        bb_sorted = resultados2.sort("count", False)
-    if sorting == cm.filter_tile.alert_sorting_method_label2:
-        bb_sorted = resultados2.sort("count", True)
-    if sorting == cm.filter_tile.alert_sorting_method_label3:
-        bb_sorted = resultados2.sort("alert_date_max", False)
-    if sorting == cm.filter_tile.alert_sorting_method_label4:
-        bb_sorted = resultados2.sort("alert_date_max", True)
+def iter_bounding_box_pages(
+    aoi,
+    alert_raster,
+    ee_reducer,
+    pixel_size,
+    min_alert_size_pixels,
+    sorting,
+    page_size=1000,
+    max_elementos=0,
+    max_retries=3,
+    properties=None,
+    precision=6,
+):
+    """
+    Yield the sorted bounding boxes of the AOI in fixed size pages.
 
-    # Use `map()` to batch-process elements in `aoi_grid`, limiting to `max_elementos`
-    if max_elementos == 0:
-        max_elementos = bb_sorted.size()
-    else:
-        max_elementos = max_elementos
+    Each page is a separate toList(page_size, offset) request on the same sorted
+    collection, so the first alerts can be used while the next pages are computed.
+    There is no ceiling on the number of alerts, pages are requested until a page
+    comes back incomplete or max_elementos is reached.
 
-    resultados3 = bb_sorted.toList(max_elementos)
+    Args:
+        aoi (ee.FeatureCollection): The area of interest.
+        alert_raster (ee.Image): Image with the bands expected by ee_reducer.
+        ee_reducer (ee.Reducer): Reducer applied to each cluster.
+        pixel_size (int): Scale of the vectorization in meters.
+        min_alert_size_pixels (int): Minimum number of pixels of a cluster.
+        sorting (str): Alert sorting method label.
+        page_size (int): Number of alerts of each page.
+        max_elementos (int): Maximum number of alerts returned, 0 for all of them.
+        max_retries (int): Maximum number of attempts for each page.
+        properties (list): Properties returned for each alert, see project_bounding_boxes.
+        precision (int): Number of decimals of the returned bbox coordinates.
+
+    Yields:
+        list: The bounding box features of the page, as returned by getInfo.
+    """
+    bounding_boxes = get_cell_bounding_boxes(
+        aoi.geometry(),
+        alert_raster,
+        ee_reducer,
+        pixel_size,
+        min_alert_size_pixels,
+    )
+    bb_sorted = project_bounding_boxes(
+        sort_bounding_boxes(bounding_boxes, sorting), sorting, properties, precision
+    )
 
-    return resultados3
+    offset = 0
+    while max_elementos <= 0 or offset < max_elementos:
+        count = page_size
+        if max_elementos > 0:
+            count = min(page_size, int(max_elementos) - offset)
+        # heavy AOIs are not retried, the caller falls back to a split extraction
+        page = evaluate_with_retry(
+            bb_sorted.toList(count, offset), max_retries, skip_errors=SPLITTABLE_ERRORS
+        )
+        if page:
+            yield page
+        if len(page) < count:
+            break
+        offset += count
 
 
-def obtener_datos_gee_total_v3(
+def obtener_datos_gee_paginated(
     aoi,
     alert_raster,
     ee_reducer,
@@ -386,141 +583,1534 @@ def obtener_datos_gee_total_v3(
     min_alert_size_pixels,
     max_elementos,
     sorting,
+    page_size=1000,
+    on_page=None,
+    properties=None,
+    precision=6,
+    start_date=None,
+    end_date=None,
+    window_months=TEMPORAL_WINDOW_MONTHS,
 ):
-    # Attempt to run the total method first
-    try:
-        return evaluate_with_retry(
-            obtener_datos_gee_total_v2(
-                aoi,
-                alert_raster,
-                ee_reducer,
-                pixel_size,
-                min_alert_size_pixels,
-                max_elementos,
-                sorting,
-            ),
-            max_retries=1,
-        )
-    except Exception as e:
-        print(
-            "Initial call to obtener_datos_gee_total_v2 failed. Retrying with obtener_datos_gee_parcial_map..."
-        )
+    """
+    Fetch all the sorted bounding boxes of the AOI, page by page when possible.
 
-    # Try running with grid size 150,000
-    try:
-        return evaluate_with_retry(
-            obtener_datos_gee_parcial_map_2(
-                aoi,
-                alert_raster,
-                ee_reducer,
-                pixel_size,
-                min_alert_size_pixels,
-                max_elementos,
-                sorting,
-                150000,
-            ),
-            max_retries=1,
-        )
-    except Exception as e:
-        print(
-            "Call to obtener_datos_gee_parcial_map with grid size 150,000 failed. Retrying with grid size 100,000..."
-        )
+    The strategy is chosen like obtener_datos_gee_total_v3. Pages are only requested
+    when the planner picks a single request over the whole AOI. The other strategies,
+    and the whole AOI when a page fails on a splittable error, go through
+    run_extraction_plan with no limit on the number of alerts.
 
-    # Try running with grid size 100,000
-    try:
-        return evaluate_with_retry(
-            obtener_datos_gee_parcial_map_2(
-                aoi,
-                alert_raster,
-                ee_reducer,
-                pixel_size,
-                min_alert_size_pixels,
-                max_elementos,
-                sorting,
-                100000,
-            ),
-            max_retries=1,
-        )
-    except Exception as e:
-        print(
-            "Call to obtener_datos_gee_parcial_map with grid size 100,000 failed. Retrying with grid size 40,000..."
-        )
+    Args:
+        aoi (ee.FeatureCollection): The area of interest.
+        alert_raster (ee.Image): Image with the bands expected by ee_reducer.
+        ee_reducer (ee.Reducer): Reducer applied to each cluster.
+        pixel_size (int): Scale of the vectorization in meters.
+        min_alert_size_pixels (int): Minimum number of pixels of a cluster.
+        max_elementos (int): Maximum number of alerts returned, 0 for all of them.
+        sorting (str): Alert sorting method label.
+        page_size (int): Number of alerts of each request.
+        on_page (callable): Called with the features of each new page, it is not
+            called for the alerts of the other strategies.
+        properties (list): Properties returned for each alert, see project_bounding_boxes.
+        precision (int): Number of decimals of the returned bbox coordinates.
+        start_date (str): First date of the alerts (YYYY-MM-DD), see plan_total_extraction.
+        end_date (str): Last date of the alerts (YYYY-MM-DD).
+        window_months (int): Length of the date windows of long date ranges in months.
 
-    # Try running with grid size 40,000
-    try:
-        return evaluate_with_retry(
-            obtener_datos_gee_parcial_map_2(
+    Returns:
+        list: The sorted bounding box features.
+    """
+    plan = plan_total_extraction(
+        aoi, alert_raster, pixel_size, start_date, end_date, window_months
+    )
+
+    if plan["strategy"] == "whole":
+        features = []
+        try:
+            for page in iter_bounding_box_pages(
                 aoi,
                 alert_raster,
                 ee_reducer,
                 pixel_size,
                 min_alert_size_pixels,
-                max_elementos,
                 sorting,
-                40000,
-            ),
-            max_retries=1,
-        )
-    except Exception as e:
-        print(
-            "Call to obtener_datos_gee_parcial_map with grid size 40,000 failed. Retrying with grid size 20,000..."
-        )
+                page_size=page_size,
+                max_elementos=max_elementos,
+                properties=properties,
+                precision=precision,
+            ):
+                features += page
+                print(f"Received {len(features)} alerts")
+                if on_page is not None:
+                    on_page(page)
+            return features
+        except Exception as e:
+            if not is_splittable_error(e):
+                raise
+            print(f"Paginated extraction failed ({e}), splitting the AOI instead")
+
+    return run_extraction_plan(
+        plan,
+        aoi,
+        alert_raster,
+        ee_reducer,
+        pixel_size,
+        min_alert_size_pixels,
+        None if max_elementos <= 0 else max_elementos,
+        sorting,
+        properties=properties,
+        precision=precision,
+        start_date=start_date,
+        end_date=end_date,
+        window_months=window_months,
+    )
 
-    # Try running with grid size 100,000
-    return evaluate_with_retry(
-        obtener_datos_gee_parcial_map_2(
-            aoi,
+
+def obtener_datos_gee_adaptive(
+    aoi,
+    alert_raster,
+    ee_reducer,
+    pixel_size,
+    min_alert_size_pixels,
+    max_elementos,
+    sorting,
+    max_depth=6,
+    pixel_budget=1e9,
+    max_workers=8,
+    properties=None,
+    precision=6,
+    cells=None,
+    keep_filter=None,
+):
+    """
+    Extract alert bounding boxes with an adaptive quadtree over the AOI.
+
+    The whole AOI (or each of the given cells) is vectorized first. Any cell that times out or exceeds the pixel
+    budget is split in 4 and only its quadrants are processed again, results of the
+    cells that already succeeded are kept. The cells of a same level are sent
+    concurrently from a bounded thread pool. All results are merged (across cell
+    edges when the AOI was split), sorted and limited on the client side. The
+    clusters touching the edge of a split cell are never limited on the EE side,
+    so the limit only applies to whole clusters that passed the size filter.
+
+    Args:
+        aoi (ee.FeatureCollection): The area of interest.
+        alert_raster (ee.Image): Image with the bands expected by ee_reducer.
+        ee_reducer (ee.Reducer): Reducer applied to each cluster.
+        pixel_size (int): Scale of the vectorization in meters.
+        min_alert_size_pixels (int): Minimum number of pixels of a cluster.
+        max_elementos (int): Maximum number of alerts returned, 0 for
+            DEFAULT_MAX_ALERTS and None for all of them.
+        sorting (str): Alert sorting method label.
+        max_depth (int): Maximum number of times a cell can be split.
+        pixel_budget (float): Maximum number of pixels processed by a single request.
+        max_workers (int): Maximum number of cells processed at the same time.
+        properties (list): Properties returned for each alert, see project_bounding_boxes.
+        precision (int): Number of decimals of the returned bbox coordinates.
+        cells (list): [xmin, ymin, xmax, ymax] bounds of the cells to start from,
+            None to start from the whole AOI.
+        keep_filter (ee.Filter): Clusters kept whatever their size, see
+            get_cell_bounding_boxes.
+
+    Returns:
+        list: The sorted bounding box features, as returned by getInfo.
+    """
+    max_features = get_max_features(max_elementos)
+
+    def extract_cell(cell):
+        bounds, depth = cell
+        if bounds is None:
+            cell_geometry = aoi.geometry()
+        else:
+            cell_geometry = ee.Geometry.Rectangle(bounds, "EPSG:4326", False)
+
+        bounding_boxes = get_cell_bounding_boxes(
+            cell_geometry,
             alert_raster,
             ee_reducer,
             pixel_size,
             min_alert_size_pixels,
-            max_elementos,
-            sorting,
-            20000,
-        ),
-        max_retries=1,
+            max_pixels=pixel_budget,
+            keep_edge_clusters=bounds is not None,
+            keep_filter=keep_filter,
+        )
+        bb_sorted = sort_bounding_boxes(bounding_boxes, sorting)
+        if bounds is None:
+            limited_boxes = [(bb_sorted, max_features)]
+        else:
+            # the clusters touching the cell edge are merged and size filtered on
+            # the client side, so all of them are needed and only the inner
+            # clusters, already size filtered, are limited
+            limited_boxes = [
+                (bb_sorted.filter(ee.Filter.eq("inside_cell", True)), max_features),
+                (bb_sorted.filter(ee.Filter.eq("inside_cell", False)), None),
+            ]
+        cell_features = ee.List([])
+        for boxes, limit in limited_boxes:
+            boxes = project_bounding_boxes(boxes, sorting, properties, precision)
+            cell_features = cell_features.cat(
+                boxes.toList(boxes.size() if limit is None else limit)
+            )
+        # cells that are too heavy are split instead of being retried as they are
+        return evaluate_with_retry(cell_features, skip_errors=SPLITTABLE_ERRORS)
+
+    features = []
+    extracted_cells = []
+    # None stands for the whole AOI, cells are [xmin, ymin, xmax, ymax] bounds
+    if cells is None:
+        pending_cells = [(None, 0)]
+    else:
+        pending_cells = [(bounds, 0) for bounds in cells]
+
+    while pending_cells:
+        failed_cells = []
+        for cell, result, error in run_cells_concurrently(
+            pending_cells, extract_cell, max_workers
+        ):
+            if error is None:
+                features += result
+                if cell[0] is not None:
+                    extracted_cells.append(cell[0])
+                continue
+            bounds, depth = cell
+            if depth >= max_depth or not is_splittable_error(error):
+                raise error
+            if bounds is None:
+                bounds = get_geometry_bounds(aoi.geometry())
+            print(f"Cell {bounds} failed at depth {depth}, splitting it in 4...")
+            failed_cells += [(quadrant, depth + 1) for quadrant in split_bounds(bounds)]
+        pending_cells = failed_cells
+
+    if extracted_cells:
+        features = merge_seam_bounding_boxes(
+            features, extracted_cells, pixel_size, min_alert_size_pixels
+        )
+    return sort_features(features, sorting)[:max_features]
+
+
+def get_alert_cells(aoi, alert_raster, pixel_size, grid_size, coarse_factor=16):
+    """
+    Return the cells of the AOI covering grid that contain alert pixels.
+
+    The alert mask is reduced with max to a scale coarse_factor times coarser than
+    pixel_size, so no alert pixel is lost, dilated by one coarse pixel so an alert
+    near a cell edge also selects the neighbour cell, and summarized per cell in one
+    request.
+
+    Args:
+        aoi (ee.FeatureCollection): The area of interest.
+        alert_raster (ee.Image): Image whose first band is the alert mask.
+        pixel_size (int): Scale of the vectorization in meters.
+        grid_size (int): Size of the grid cells in meters.
+        coarse_factor (int): Ratio between the coarse scale and pixel_size.
+
+    Returns:
+        list: The [xmin, ymin, xmax, ymax] bounds of the cells with alerts.
+    """
+    coarse_scale = pixel_size * coarse_factor
+    coarse_mask = (
+        alert_raster.select(0)
+        .unmask(0)
+        .gt(0)
+        .setDefaultProjection("EPSG:4326", None, pixel_size)
+        .reduceResolution(ee.Reducer.max(), False, (coarse_factor + 2) ** 2)
+        .reproject(ee.Projection("EPSG:4326").atScale(coarse_scale))
+        # the coarse pixels are not aligned on the grid cells and each one is
+        # counted in a single cell, dilated by one pixel the cells can only be
+        # over selected
+        .focalMax(1, "square", "pixels")
+    )
+    alert_cells = (
+        coarse_mask.reduceRegions(
+            collection=aoi.geometry().coveringGrid("EPSG:4326", grid_size),
+            reducer=ee.Reducer.max(),
+            scale=coarse_scale,
+        )
+        .filter(ee.Filter.eq("max", 1))
+        .map(
+            lambda cell: ee.Feature(
+                None, {"ring": cell.geometry().bounds(1).coordinates().get(0)}
+            )
+        )
     )
+    rings = evaluate_with_retry(alert_cells.aggregate_array("ring"))
+    return [ring_to_bounds(ring) for ring in rings]
 
 
-# Function to convert list of polygons to geodataframe
-def convert_to_geopandas(polygon_features):
-    # Convert polygon features into GeoDataFrame and calculate centroids
-    combined_features = []
+def obtener_datos_gee_coarse_to_fine(
+    aoi,
+    alert_raster,
+    ee_reducer,
+    pixel_size,
+    min_alert_size_pixels,
+    max_elementos,
+    sorting,
+    grid_size,
+    coarse_factor=16,
+    properties=None,
+    precision=6,
+):
+    """
+    Extract alert bounding boxes at full resolution only where the AOI has alerts.
 
-    for feature in polygon_features:
-        polygon = Polygon(feature["geometry"]["coordinates"][0])
+    The covering grid cells holding alert pixels are found at a coarse scale first,
+    the empty cells are skipped and the others are processed by the adaptive
+    extraction, which still splits the cells that fail.
 
-        # Extract properties and add relevant information
-        properties = feature["properties"]
-        properties["gee_id"] = feature["id"]
-        properties["bounding_box"] = polygon
-        properties["point"] = polygon.centroid  # Add centroid as 'point'
+    Args:
+        aoi (ee.FeatureCollection): The area of interest.
+        alert_raster (ee.Image): Image with the bands expected by ee_reducer.
+        ee_reducer (ee.Reducer): Reducer applied to each cluster.
+        pixel_size (int): Scale of the vectorization in meters.
+        min_alert_size_pixels (int): Minimum number of pixels of a cluster.
+        max_elementos (int): Maximum number of alerts returned, 0 for
+            DEFAULT_MAX_ALERTS and None for all of them.
+        sorting (str): Alert sorting method label.
+        grid_size (int): Size of the grid cells in meters.
+        coarse_factor (int): Ratio between the coarse scale and pixel_size.
+        properties (list): Properties returned for each alert, see project_bounding_boxes.
+        precision (int): Number of decimals of the returned bbox coordinates.
 
-        combined_features.append(properties)
+    Returns:
+        list: The sorted bounding box features, as returned by getInfo.
+    """
+    cells = get_alert_cells(aoi, alert_raster, pixel_size, grid_size, coarse_factor)
+    print(f"{len(cells)} grid cells with alerts")
+    if not cells:
+        return []
+
+    return obtener_datos_gee_adaptive(
+        aoi,
+        alert_raster,
+        ee_reducer,
+        pixel_size,
+        min_alert_size_pixels,
+        max_elementos,
+        sorting,
+        properties=properties,
+        precision=precision,
+        cells=cells,
+    )
 
-    # Create GeoDataFrame
-    gdf = gpd.GeoDataFrame(combined_features, geometry="point")
+
+def date_to_julian(date_string):
+    """Convert a YYYY-MM-DD date to the YYYY.ddd format of the alert date band."""
+    day = datetime.strptime(date_string, "%Y-%m-%d")
+    return day.year + day.timetuple().tm_yday / 1000
+
+
+def split_date_range(start_date, end_date, window_months=3):
+    """
+    Split a date range into consecutive windows of a few months.
+
+    The windows are aligned on the calendar, every window_months months from January
+    (quarters for the default 3 months), so only the first and last windows can be
+    shorter. window_months should divide 12.
+
+    Args:
+        start_date (str): First date of the range (YYYY-MM-DD).
+        end_date (str): Last date of the range (YYYY-MM-DD).
+        window_months (int): Length of the windows in months.
+
+    Returns:
+        list: (start, end) YYYY-MM-DD dates of each window, end is exclusive except
+            for the last window that ends on end_date included.
+    """
+    start = datetime.strptime(start_date, "%Y-%m-%d")
+    end = datetime.strptime(end_date, "%Y-%m-%d")
+    windows = []
+    while start <= end:
+        # months from the start of the year to the next window boundary
+        month = (start.month - 1) // window_months * window_months + window_months
+        window_end = start.replace(
+            year=start.year + month // 12, month=month % 12 + 1, day=1
+        )
+        windows.append(
+            (start.strftime("%Y-%m-%d"), min(window_end, end).strftime("%Y-%m-%d"))
+        )
+        start = window_end
+    # the last window includes end_date
+    windows[-1] = (windows[-1][0], (end + timedelta(days=1)).strftime("%Y-%m-%d"))
+    return windows
+
+
+def merge_window_bounding_boxes(features, windows, pixel_size, min_alert_size_pixels=0):
+    """
+    Merge the bounding boxes of the clusters that continue across date windows.
+
+    Boxes of different windows that overlap or touch are parts of the same cluster,
+    boxes of a same window are never merged together.
+
+    Args:
+        features (list): Bounding box features.
+        windows (list): Index of the date window of each feature.
+        pixel_size (int): Scale of the vectorization in meters.
+        min_alert_size_pixels (int): Minimum number of pixels of a merged cluster.
+
+    Returns:
+        list: The merged bounding box features, in no particular order.
+    """
+    if not features:
+        return []
+
+    tolerance = 1.5 * pixel_size / 111320
+    bounds = np.array(
+        [get_feature_bounds(feature) for feature in features], dtype=float
+    )
+    windows = np.asarray(windows)
+
+    tree = shapely.STRtree(shapely.box(*bounds.T))
+    first, second = tree.query(
+        shapely.box(*(bounds + [-tolerance, -tolerance, tolerance, tolerance]).T),
+        predicate="intersects",
+    )
+    keep = (first < second) & (windows[first] != windows[second])
+
+    merged = merge_bounding_box_pairs(features, np.stack([first[keep], second[keep]]))
+    if len(merged) < len(features):
+        print(f"Merged {len(features)} boxes into {len(merged)} across date windows")
+    return [
+        feature
+        for feature in merged
+        if feature["properties"]["count"] >= min_alert_size_pixels
+    ]
+
+
+def obtener_datos_gee_temporal(
+    aoi,
+    alert_raster,
+    ee_reducer,
+    pixel_size,
+    min_alert_size_pixels,
+    max_elementos,
+    sorting,
+    start_date,
+    end_date,
+    window_months=3,
+    max_workers=4,
+    properties=None,
+    precision=6,
+    edge_days=TEMPORAL_EDGE_DAYS,
+):
+    """
+    Extract alert bounding boxes date window by date window.
+
+    The alert raster is masked to each window of the date range and the windows are
+    extracted in parallel with the adaptive extraction, so each request only holds
+    the alerts of a few months. The size filter is applied on the EE side except for
+    the clusters with alerts less than edge_days away from a window edge, which may
+    continue in the next window. The clusters continuing across windows are merged
+    by spatial overlap and the minimum size, sorting and limit are applied again on
+    the merged clusters. Small parts of a cluster far from the window edges are
+    dropped, so the result approximates an extraction of the whole date range.
+
+    Args:
+        aoi (ee.FeatureCollection): The area of interest.
+        alert_raster (ee.Image): Image with the bands expected by ee_reducer and a
+            "date" band (YYYY.ddd).
+        ee_reducer (ee.Reducer): Reducer applied to each cluster.
+        pixel_size (int): Scale of the vectorization in meters.
+        min_alert_size_pixels (int): Minimum number of pixels of a merged cluster.
+        max_elementos (int): Maximum number of alerts returned, 0 for
+            DEFAULT_MAX_ALERTS and None for all of them.
+        sorting (str): Alert sorting method label.
+        start_date (str): First date of the range (YYYY-MM-DD).
+        end_date (str): Last date of the range (YYYY-MM-DD).
+        window_months (int): Length of the date windows in months.
+        max_workers (int): Maximum number of windows extracted at the same time.
+        properties (list): Properties returned for each alert, see project_bounding_boxes.
+        precision (int): Number of decimals of the returned bbox coordinates.
+        edge_days (int): Clusters with alerts closer than this to a window edge are
+            extracted whatever their size.
+
+    Returns:
+        list: The sorted bounding box features.
+    """
+    max_features = get_max_features(max_elementos)
+    windows = split_date_range(start_date, end_date, window_months)
+    print(f"Extracting alerts in {len(windows)} date windows")
+
+    def shift_date(date_string, days):
+        day = datetime.strptime(date_string, "%Y-%m-%d") + timedelta(days=days)
+        return date_to_julian(day.strftime("%Y-%m-%d"))
+
+    def extract_window(window):
+        alert_date = alert_raster.select("date")
+        window_mask = alert_date.gte(date_to_julian(window[0])).And(
+            alert_date.lt(date_to_julian(window[1]))
+        )
+        # the clusters near an edge shared with another window keep all their parts
+        edge_filters = []
+        if window != windows[0]:
+            edge_filters.append(
+                ee.Filter.lt("alert_date_min", shift_date(window[0], edge_days))
+            )
+        if window != windows[-1]:
+            edge_filters.append(
+                ee.Filter.gte("alert_date_max", shift_date(window[1], -edge_days))
+            )
+        # no limit, it only applies to the merged clusters
+        return obtener_datos_gee_adaptive(
+            aoi,
+            alert_raster.updateMask(window_mask),
+            ee_reducer,
+            pixel_size,
+            min_alert_size_pixels,
+            None,
+            sorting,
+            max_workers=2,
+            properties=properties,
+            precision=precision,
+            keep_filter=ee.Filter.Or(*edge_filters) if edge_filters else None,
+        )
+
+    features, feature_windows = [], []
+    for window, result, error in run_cells_concurrently(
+        windows, extract_window, max_workers
+    ):
+        if error is not None:
+            raise error
+        features += result
+        feature_windows += [windows.index(window)] * len(result)
+
+    features = merge_window_bounding_boxes(
+        features, feature_windows, pixel_size, min_alert_size_pixels
+    )
+    return sort_features(features, sorting)[:max_features]
+
+
+# Meters per degree EE uses to scale EPSG:4326 (equatorial circumference / 360)
+EE_METERS_PER_DEGREE = 111319.49079327357
+
+
+def download_alert_tile(image, x_origin, y_origin, pixel_degrees, width, height):
+    """
+    Download the alert source and date bands of a tile as NumPy arrays.
+
+    Args:
+        image (ee.Image): Image with the "alert_source" and "date" bands.
+        x_origin (float): Longitude of the upper left corner of the tile.
+        y_origin (float): Latitude of the upper left corner of the tile.
+        pixel_degrees (float): Pixel size in degrees.
+        width (int): Width of the tile in pixels.
+        height (int): Height of the tile in pixels.
+
+    Returns:
+        tuple: (alert_source, date) arrays of shape (height, width).
+    """
+    request = {
+        "expression": image.select(["alert_source", "date"]).unmask(0).toFloat(),
+        "fileFormat": "NUMPY_NDARRAY",
+        "grid": {
+            "dimensions": {"width": width, "height": height},
+            "affineTransform": {
+                "scaleX": pixel_degrees,
+                "shearX": 0,
+                "translateX": x_origin,
+                "shearY": 0,
+                "scaleY": -pixel_degrees,
+                "translateY": y_origin,
+            },
+            "crsCode": "EPSG:4326",
+        },
+    }
+    data = ee.data.computePixels(request)
+    return data["alert_source"], data["date"]
+
+
+def obtener_datos_local_raster(
+    aoi,
+    alert_raster,
+    pixel_size,
+    min_alert_size_pixels,
+    max_elementos,
+    sorting,
+    tile_size=1024,
+    max_workers=4,
+    max_retries=3,
+    precision=6,
+):
+    """
+    Extract alert bounding boxes by labelling the alert raster on the client side.
+
+    The "alert_source" and "date" bands are downloaded as tiles of NumPy arrays and the
+    8-connected clusters are labelled locally, so no reduceToVectors request is sent
+    to EE. Each tile is labelled as soon as it is downloaded and only its cluster
+    summaries and edge lines are kept for the merge across tile edges. The tiles are
+    snapped on the EE pixel grid, so the boxes are the ones reduceToVectors returns
+    and the output has the same schema, rounding and sorting as
+    obtener_datos_gee_adaptive.
+
+    Args:
+        aoi (ee.FeatureCollection): The area of interest.
+        alert_raster (ee.Image): Image with the "alert_source" and "date" bands.
+        pixel_size (int): Pixel size in meters.
+        min_alert_size_pixels (int): Minimum number of pixels of a cluster.
+        max_elementos (int): Maximum number of alerts returned, 0 for
+            DEFAULT_MAX_ALERTS and None for all of them.
+        sorting (str): Alert sorting method label.
+        tile_size (int): Size of the downloaded tiles in pixels.
+        max_workers (int): Maximum number of tiles downloaded at the same time.
+        max_retries (int): Maximum number of attempts for each tile.
+        precision (int): Number of decimals of the returned bbox coordinates.
+
+    Returns:
+        list: The sorted bounding box features.
+    """
+    max_features = get_max_features(max_elementos)
+
+    # EPSG:4326 grid at the equator, same as the default projection of reduceToVectors,
+    # the origin is snapped on its pixels so computePixels does not resample
+    pixel_degrees = pixel_size / EE_METERS_PER_DEGREE
+    xmin, ymin, xmax, ymax = get_geometry_bounds(aoi.geometry())
+    xmin = floor(xmin / pixel_degrees) * pixel_degrees
+    ymax = ceil(ymax / pixel_degrees) * pixel_degrees
+    n_cols = ceil((xmax - xmin) / pixel_degrees)
+    n_rows = ceil((ymax - ymin) / pixel_degrees)
+
+    tiles_index = [
+        (tile_row, tile_col)
+        for tile_row in range(ceil(n_rows / tile_size))
+        for tile_col in range(ceil(n_cols / tile_size))
+    ]
+
+    def extract_tile(tile):
+        tile_row, tile_col = tile
+        alert_source, alert_date = DEFAULT_RETRY_POLICY.call(
+            lambda: download_alert_tile(
+                alert_raster,
+                xmin + tile_col * tile_size * pixel_degrees,
+                ymax - tile_row * tile_size * pixel_degrees,
+                pixel_degrees,
+                min(tile_size, n_cols - tile_col * tile_size),
+                min(tile_size, n_rows - tile_row * tile_size),
+            ),
+            max_retries,
+        )
+        # label the tile as soon as it arrives, only its summary and edges are kept
+        return summarize_alert_tile(
+            alert_source, alert_date, tile_row * tile_size, tile_col * tile_size
+        )
+
+    tile_summaries = {}
+    for tile, tile_summary, error in run_cells_concurrently(
+        tiles_index, extract_tile, max_workers
+    ):
+        if error is not None:
+            raise error
+        tile_summaries[tile] = tile_summary
+
+    features = merge_alert_tiles(
+        tile_summaries,
+        (xmin, pixel_degrees, ymax, -pixel_degrees),
+        min_alert_size_pixels,
+    )
+    # same compact bbox as project_bounding_boxes, so the boxes can be compared
+    for feature in features:
+        feature["properties"]["bbox"] = [
+            round(value, precision) for value in get_feature_bounds(feature)
+        ]
+        feature["geometry"] = None
+
+    return sort_features(features, sorting)[:max_features]
+
+
+# Thresholds of the extraction planner, in pixels at the vectorization scale
+WHOLE_AOI_MAX_PIXELS = 1e9
+WHOLE_AOI_MAX_VERTICES = 5000
+LOCAL_RASTER_MIN_ALERT_PIXELS = 5e6
+LOCAL_RASTER_MAX_PIXELS = 2.5e8
+GRID_CELL_MAX_PIXELS = 5e7
+GRID_CELL_MAX_ALERT_PIXELS = 1e6
+
+
+def estimate_extraction_cost(aoi, alert_raster, pixel_size, coarse_factor=16):
+    """
+    Measure the AOI and its alerts with a single cheap EE request.
+
+    The alert mask is averaged with reduceResolution to a scale coarse_factor times
+    coarser than the vectorization, like get_alert_cells, so each coarse pixel holds
+    the fraction of its alert pixels and their sum times coarse_factor**2 estimates
+    the number of alert pixels at pixel_size.
+
+    Args:
+        aoi (ee.FeatureCollection): The area of interest.
+        alert_raster (ee.Image): Image whose first band is the alert mask.
+        pixel_size (int): Scale of the vectorization in meters.
+        coarse_factor (int): Ratio between the counting scale and pixel_size.
+
+    Returns:
+        dict: area and bounds_area (m2), vertices, and alert_pixels (estimated at
+            pixel_size).
+    """
+    geometry = aoi.geometry()
+    coarse_scale = pixel_size * coarse_factor
+    alert_fraction = (
+        alert_raster.select(0)
+        .unmask(0)
+        .gt(0)
+        .setDefaultProjection("EPSG:4326", None, pixel_size)
+        .reduceResolution(ee.Reducer.mean(), False, (coarse_factor + 2) ** 2)
+        .reproject(ee.Projection("EPSG:4326").atScale(coarse_scale))
+    )
+    coarse_sum = (
+        alert_fraction.reduceRegion(
+            reducer=ee.Reducer.sum(),
+            geometry=geometry,
+            scale=coarse_scale,
+            maxPixels=1e13,
+        )
+        .values()
+        .get(0)
+    )
+    estimate = evaluate_with_retry(
+        ee.Dictionary(
+            {
+                "area": geometry.area(1),
+                "bounds_area": geometry.bounds(1).area(1),
+                "vertices": geometry.coordinates().flatten().length().divide(2),
+                "alert_sum": coarse_sum,
+            }
+        )
+    )
+    estimate["alert_pixels"] = (estimate.pop("alert_sum") or 0) * coarse_factor**2
+    return estimate
+
+
+def plan_extraction(estimate, pixel_size):
+    """
+    Choose the extraction strategy from the output of estimate_extraction_cost.
+
+    Strategies:
+        - "whole": a single reduceToVectors over the AOI (obtener_datos_gee_adaptive).
+        - "local": alert raster downloaded and labelled on the client side, used for
+          dense alerts over an extent small enough to download.
+        - "tiled": reduceToVectors per grid cell, grid_size is chosen so a cell stays
+          below the pixel and alert budgets.
+
+    Args:
+        estimate (dict): Output of estimate_extraction_cost.
+        pixel_size (int): Scale of the vectorization in meters.
+
+    Returns:
+        dict: The "strategy", the "grid_size" in meters (tiled only) and the "reason".
+    """
+    pixel_area = pixel_size**2
+    aoi_pixels = estimate["area"] / pixel_area
+    bounds_pixels = estimate["bounds_area"] / pixel_area
+    alert_pixels = estimate["alert_pixels"]
+    vertices = estimate["vertices"]
+
+    if (
+        aoi_pixels <= WHOLE_AOI_MAX_PIXELS
+        and vertices <= WHOLE_AOI_MAX_VERTICES
+        and alert_pixels <= GRID_CELL_MAX_ALERT_PIXELS
+    ):
+        return {
+            "strategy": "whole",
+            "grid_size": None,
+            "reason": f"{aoi_pixels:.3g} pixels, {alert_pixels:.3g} alert pixels",
+        }
+
+    if (
+        alert_pixels >= LOCAL_RASTER_MIN_ALERT_PIXELS
+        and bounds_pixels <= LOCAL_RASTER_MAX_PIXELS
+    ):
+        return {
+            "strategy": "local",
+            "grid_size": None,
+            "reason": f"{alert_pixels:.3g} alert pixels in {bounds_pixels:.3g} pixels",
+        }
+
+    n_cells = max(
+        aoi_pixels / GRID_CELL_MAX_PIXELS,
+        alert_pixels / GRID_CELL_MAX_ALERT_PIXELS,
+        1,
+    )
+    grid_size = max(1000, floor(sqrt(estimate["area"] / n_cells) / 1000) * 1000)
+    return {
+        "strategy": "tiled",
+        "grid_size": grid_size,
+        "reason": f"{aoi_pixels:.3g} pixels, {alert_pixels:.3g} alert pixels, "
+        f"{vertices:.0f} vertices",
+    }
+
+
+# Strata of the alert samples: alert sources, size class and admin region
+SAMPLE_SIZE_BREAKS_HA = [1, 5, 20]
+SAMPLE_ADMIN_REGIONS = "FAO/GAUL/2015/level1"
+SAMPLE_ADMIN_PROPERTY = "ADM1_NAME"
+
+
+def sample_bounding_boxes(
+    fc,
+    pixel_size,
+    sample_size,
+    seed=0,
+    min_per_stratum=1,
+    size_breaks_ha=None,
+    admin_regions=None,
+    admin_property=SAMPLE_ADMIN_PROPERTY,
+    region=None,
+):
+    """
+    Draw a seeded stratified random sample of bounding boxes on the EE side.
+
+    Strata combine the alert_source_mask, a size class (from size_breaks_ha) and the
+    admin region of the box. The sample size is allocated proportionally to the
+    strata sizes with at least min_per_stratum boxes per stratum, and each sampled
+    box gets its stratum and inclusion_probability (n_h / N_h).
+
+    A single grouped reduction collects the random values of each stratum, and the
+    n_h-th smallest one is used as the stratum threshold, so the boxes are filtered
+    once instead of once per stratum.
+
+    Args:
+        fc (ee.FeatureCollection): Bounding boxes reduced with the compact reducer.
+        pixel_size (int): Scale of the vectorization in meters.
+        sample_size (int): Approximate total number of sampled boxes.
+        seed (int): Seed of the random column, the same seed gives the same sample.
+        min_per_stratum (int): Minimum number of boxes sampled in each stratum.
+        size_breaks_ha (list): Limits of the size classes in hectares.
+        admin_regions (ee.FeatureCollection): Admin regions, GAUL level 1 by default.
+        admin_property (str): Name of the admin region property.
+        region (ee.Geometry): Area the admin regions are filtered to, usually the AOI.
+
+    Returns:
+        ee.FeatureCollection: The sampled boxes.
+    """
+    size_breaks_ha = SAMPLE_SIZE_BREAKS_HA if size_breaks_ha is None else size_breaks_ha
+    if admin_regions is None:
+        admin_regions = ee.FeatureCollection(SAMPLE_ADMIN_REGIONS)
+    if region is not None:
+        admin_regions = admin_regions.filterBounds(region)
+
+    # Attach the admin region, boxes outside any region are kept
+    with_admin = ee.Join.saveFirst(matchKey="admin_region", outer=True).apply(
+        fc,
+        admin_regions,
+        ee.Filter.intersects(leftField=".geo", rightField=".geo"),
+    )
+
+    def set_stratum(feature):
+        area_ha = ee.Number(feature.get("count")).multiply(pixel_size**2 / 10000)
+        size_class = ee.Number(0)
+        for size_break in size_breaks_ha:
+            size_class = size_class.add(area_ha.gte(size_break))
+        admin_region = ee.Algorithms.If(
+            feature.get("admin_region"),
+            ee.Feature(feature.get("admin_region")).get(admin_property),
+            "none",
+        )
+        stratum = (
+            ee.Number(feature.get("alert_source_mask"))
+            .format("%d")
+            .cat("_")
+            .cat(size_class.format("%d"))
+            .cat("_")
+            .cat(ee.String(admin_region))
+        )
+        return ee.Feature(feature).set("stratum", stratum)
+
+    stratified = ee.FeatureCollection(with_admin.map(set_stratum)).randomColumn(
+        "random", seed
+    )
+    groups = ee.List(
+        stratified.reduceColumns(
+            ee.Reducer.toList().group(groupField=1, groupName="stratum"),
+            ["random", "stratum"],
+        ).get("groups")
+    )
+    total = stratified.size()
+
+    def allocate_stratum(group):
+        randoms = ee.List(ee.Dictionary(group).get("list")).sort()
+        stratum_size = randoms.size()
+        stratum_sample = (
+            stratum_size.multiply(sample_size)
+            .divide(total)
+            .round()
+            .max(min_per_stratum)
+            .min(stratum_size)
+        )
+        threshold = ee.Algorithms.If(
+            stratum_sample.gt(0), randoms.get(stratum_sample.subtract(1)), -1
+        )
+        return ee.List([threshold, stratum_sample.divide(stratum_size)])
+
+    strata = groups.map(lambda group: ee.Dictionary(group).get("stratum"))
+    allocations = groups.map(allocate_stratum)
+    thresholds = ee.Dictionary.fromLists(
+        strata, allocations.map(lambda allocation: ee.List(allocation).get(0))
+    )
+    probabilities = ee.Dictionary.fromLists(
+        strata, allocations.map(lambda allocation: ee.List(allocation).get(1))
+    )
+
+    return stratified.map(
+        lambda feature: feature.set(
+            {
+                "random_threshold": thresholds.get(feature.get("stratum")),
+                "inclusion_probability": probabilities.get(feature.get("stratum")),
+            }
+        )
+    ).filter(
+        ee.Filter.lessThanOrEquals(leftField="random", rightField="random_threshold")
+    )
+
+
+def sample_features(
+    features,
+    pixel_size,
+    sample_size,
+    seed=0,
+    min_per_stratum=1,
+    size_breaks_ha=None,
+):
+    """
+    Draw a seeded stratified random sample of bounding box features on the client side.
+
+    Same allocation as sample_bounding_boxes, used when the AOI is too heavy to be
+    sampled on the EE side. The strata only combine the alert_source_mask and the
+    size class since the boxes have no admin region.
+
+    Args:
+        features (list): Bounding box features with count and alert_source_mask.
+        pixel_size (int): Scale of the vectorization in meters.
+        sample_size (int): Approximate total number of sampled features.
+        seed (int): Seed of the sample.
+        min_per_stratum (int): Minimum number of features sampled in each stratum.
+        size_breaks_ha (list): Limits of the size classes in hectares.
+
+    Returns:
+        list: The sampled features, with stratum and inclusion_probability.
+    """
+    size_breaks_ha = SAMPLE_SIZE_BREAKS_HA if size_breaks_ha is None else size_breaks_ha
+    strata = {}
+    for feature in features:
+        properties = feature["properties"]
+        area_ha = properties["count"] * pixel_size**2 / 10000
+        size_class = sum(area_ha >= size_break for size_break in size_breaks_ha)
+        stratum = f"{properties['alert_source_mask']}_{size_class}"
+        strata.setdefault(stratum, []).append(feature)
+
+    generator = random.Random(seed)
+    sample = []
+    for stratum, stratum_features in sorted(strata.items()):
+        stratum_size = len(stratum_features)
+        stratum_sample = floor(stratum_size * sample_size / len(features) + 0.5)
+        stratum_sample = min(max(stratum_sample, min_per_stratum), stratum_size)
+        for feature in generator.sample(stratum_features, stratum_sample):
+            feature["properties"]["stratum"] = stratum
+            feature["properties"]["inclusion_probability"] = (
+                stratum_sample / stratum_size
+            )
+            sample.append(feature)
+    return sample
+
+
+def obtener_datos_gee_sample(
+    aoi,
+    alert_raster,
+    ee_reducer,
+    pixel_size,
+    min_alert_size_pixels,
+    sample_size,
+    sorting,
+    seed=0,
+    min_per_stratum=1,
+    size_breaks_ha=None,
+    admin_regions=None,
+    admin_property=SAMPLE_ADMIN_PROPERTY,
+    properties=None,
+    precision=6,
+):
+    """
+    Extract a stratified random sample of the alert bounding boxes of the AOI.
+
+    The clusters are still vectorized on the EE side but only the sampled boxes
+    are downloaded, with their stratum and inclusion_probability properties. See
+    sample_bounding_boxes for the strata and the allocation. When the AOI is too
+    heavy for a single request, all its boxes are extracted with the planned
+    strategy (see run_extraction_plan) and sampled on the client side with
+    sample_features.
+
+    Args:
+        aoi (ee.FeatureCollection): The area of interest.
+        alert_raster (ee.Image): Image with the bands expected by ee_reducer.
+        ee_reducer (ee.Reducer): The compact reducer of create_alert_reducer.
+        pixel_size (int): Scale of the vectorization in meters.
+        min_alert_size_pixels (int): Minimum number of pixels of a cluster.
+        sample_size (int): Approximate total number of sampled alerts.
+        sorting (str): Alert sorting method label, used to order the sample.
+        seed (int): Seed of the sample.
+        min_per_stratum (int): Minimum number of alerts sampled in each stratum.
+        size_breaks_ha (list): Limits of the size classes in hectares.
+        admin_regions (ee.FeatureCollection): Admin regions, GAUL level 1 by default.
+        admin_property (str): Name of the admin region property.
+        properties (list): Properties returned for each alert, see project_bounding_boxes.
+        precision (int): Number of decimals of the returned bbox coordinates.
+
+    Returns:
+        list: The sorted sampled bounding box features.
+    """
+    bounding_boxes = get_cell_bounding_boxes(
+        aoi.geometry(),
+        alert_raster,
+        ee_reducer,
+        pixel_size,
+        min_alert_size_pixels,
+    )
+    sample = sample_bounding_boxes(
+        bounding_boxes,
+        pixel_size,
+        sample_size,
+        seed,
+        min_per_stratum,
+        size_breaks_ha,
+        admin_regions,
+        admin_property,
+        aoi.geometry(),
+    )
+    properties = list(ALERT_PROPERTIES if properties is None else properties)
+    bb_sorted = project_bounding_boxes(
+        sort_bounding_boxes(sample, sorting),
+        sorting,
+        properties + ["stratum", "inclusion_probability"],
+        precision,
+    )
+    try:
+        # heavy AOIs are not retried, they are extracted with a split strategy
+        features = evaluate_with_retry(
+            bb_sorted.toList(bb_sorted.size()), skip_errors=SPLITTABLE_ERRORS
+        )
+    except Exception as e:
+        if not is_splittable_error(e):
+            raise
+        print(f"Sample extraction failed ({e}), sampling the split extraction instead")
+        population = run_extraction_plan(
+            plan_total_extraction(aoi, alert_raster, pixel_size),
+            aoi,
+            alert_raster,
+            ee_reducer,
+            pixel_size,
+            min_alert_size_pixels,
+            None,
+            sorting,
+            properties=properties,
+            precision=precision,
+        )
+        features = sort_features(
+            sample_features(
+                population,
+                pixel_size,
+                sample_size,
+                seed,
+                min_per_stratum,
+                size_breaks_ha,
+            ),
+            sorting,
+        )
+    print(f"Sampled {len(features)} alerts")
+    return features
+
+
+# Size in meters of the cells of the alert hotspot grid
+HOTSPOT_CELL_SIZE = 10000
+# Maximum number of hotspot cells kept, the ones with the largest alert area
+HOTSPOT_MAX_CELLS = 5000
+
+
+def get_alert_hotspots(
+    aoi, alert_raster, pixel_size, cell_size=HOTSPOT_CELL_SIZE, coarse_factor=16
+):
+    """
+    Aggregate the alert pixels of the AOI into a grid of hotspot cells.
+
+    The alert mask is averaged with reduceResolution to a scale coarse_factor times
+    coarser than pixel_size, like estimate_extraction_cost, and a single
+    reduceRegions over the covering grid sums the alert area of each cell and keeps
+    its latest alert date. The cells are evaluated once so the map and the cell
+    lookup do not recompute them.
+
+    Args:
+        aoi (ee.FeatureCollection): The area of interest.
+        alert_raster (ee.Image): Image whose first band is the alert mask, with a
+            "date" band (YYYY.ddd).
+        pixel_size (int): Scale of the vectorization in meters.
+        cell_size (int): Size of the grid cells in meters.
+        coarse_factor (int): Ratio between the reduction scale and pixel_size.
+
+    Returns:
+        list: GeoJSON features of the cells with alerts, with their alert area
+            (area_ha, geodesic) and latest_date properties.
+    """
+    coarse_scale = pixel_size * coarse_factor
+    coarse_projection = ee.Projection("EPSG:4326").atScale(coarse_scale)
+    alert_mask = alert_raster.select(0).unmask(0).gt(0)
+    alert_fraction = (
+        alert_mask.setDefaultProjection("EPSG:4326", None, pixel_size)
+        .reduceResolution(ee.Reducer.mean(), False, (coarse_factor + 2) ** 2)
+        .reproject(coarse_projection)
+    )
+    latest_date = (
+        alert_raster.select("date")
+        .updateMask(alert_mask)
+        .setDefaultProjection("EPSG:4326", None, pixel_size)
+        .reduceResolution(ee.Reducer.max(), False, (coarse_factor + 2) ** 2)
+        .reproject(coarse_projection)
+    )
+    hotspot_image = (
+        alert_fraction.multiply(ee.Image.pixelArea())
+        .divide(10000)
+        .rename("area_ha")
+        .addBands(latest_date.rename("latest_date"))
+    )
+    hotspot_reducer = (
+        ee.Reducer.sum()
+        .setOutputs(["area_ha"])
+        .combine(ee.Reducer.max().setOutputs(["latest_date"]))
+    )
+    hotspots = (
+        hotspot_image.reduceRegions(
+            collection=aoi.geometry().coveringGrid("EPSG:4326", cell_size),
+            reducer=hotspot_reducer,
+            scale=coarse_scale,
+            tileScale=4,
+        )
+        .filter(ee.Filter.gt("area_ha", 0))
+        .limit(HOTSPOT_MAX_CELLS, "area_ha", False)
+    )
+    features = evaluate_with_retry(hotspots)["features"]
+    print(f"Found {len(features)} alert hotspot cells")
+    return features
+
+
+def get_hotspot_cell(hotspots, lon, lat):
+    """
+    Return the hotspot cell at a location.
+
+    Args:
+        hotspots (list): Output of get_alert_hotspots.
+        lon (float): Longitude of the location.
+        lat (float): Latitude of the location.
+
+    Returns:
+        dict: The GeoJSON feature of the cell, None if there is no hotspot at this
+            location.
+    """
+    location = Point(lon, lat)
+    for feature in hotspots:
+        if shape(feature["geometry"]).intersects(location):
+            return feature
+    return None
+
+
+def get_hotspot_bounds(cell):
+    """Return the [xmin, ymin, xmax, ymax] bounds of a hotspot cell."""
+    return list(shape(cell["geometry"]).bounds)
+
+
+def custom_reduce_image_collection(image_collection):
+    """
+    Reduces an ee.ImageCollection with custom reducers for specific bands.
+
+    Args:
+        image_collection (ee.ImageCollection): The input ImageCollection containing 'alerts' and 'date' bands.
+
+    Returns:
+        ee.Image: A single reduced image with the max of 'alerts' and min of 'date'.
+    """
+    # Define reducers for the bands
+    sum_alerts_reducer = ee.Reducer.sum()
+    min_date_reducer = ee.Reducer.min()
+
+    # Apply the reducers to the ImageCollection
+    reduced_alerts = image_collection.select("alert").reduce(sum_alerts_reducer)
+    reduced_date = image_collection.select("date").reduce(min_date_reducer)
+
+    # Combine the reduced results into a single image
+    combined_image = reduced_alerts.rename("alert").addBands(
+        reduced_date.rename("date")
+    )
+
+    return combined_image
+
+
+def iter_partial_bounding_boxes(
+    aoi,
+    alert_raster,
+    ee_reducer,
+    pixel_size,
+    min_alert_size_pixels,
+    sorting,
+    grid_size,
+    batch_limit,
+    first_step=40,
+    step=20,
+    max_retries=3,
+    properties=None,
+    precision=6,
+):
+    """
+    Yield the bounding boxes of the AOI covering grid, a batch of cells at a time.
+
+    Each request only evaluates the cells added since the previous one, so the
+    server work grows linearly with the number of scanned cells.
+
+    Args:
+        aoi (ee.FeatureCollection): The area of interest.
+        alert_raster (ee.Image): Image with the bands expected by ee_reducer.
+        ee_reducer (ee.Reducer): Reducer applied to each cluster.
+        pixel_size (int): Scale of the vectorization in meters.
+        min_alert_size_pixels (int): Minimum number of pixels of a cluster.
+        sorting (str): Alert sorting method label.
+        grid_size (int): Size of the grid cells in meters.
+        batch_limit (int): Maximum number of bounding boxes returned for a batch.
+        first_step (int): Number of cells of the first batch.
+        step (int): Number of cells of the next batches.
+        max_retries (int): Maximum number of attempts for each batch.
+        properties (list): Properties returned for each alert, see project_bounding_boxes.
+        precision (int): Number of decimals of the returned bbox coordinates.
+
+    Yields:
+        list: The sorted bounding box features found in the batch.
+    """
+    aoi_grid = aoi.geometry().coveringGrid("EPSG:4326", grid_size)
+    aoi_grid_size = evaluate_with_retry(aoi_grid.size(), max_retries)
+
+    offset = 0
+    batch_size = first_step
+    while offset < aoi_grid_size:
+        cells = ee.FeatureCollection(aoi_grid.toList(batch_size, offset))
+        bounding_boxes = cells.map(
+            lambda cell: get_cell_bounding_boxes(
+                cell.geometry(),
+                alert_raster,
+                ee_reducer,
+                pixel_size,
+                min_alert_size_pixels,
+            )
+        ).flatten()
+        bb_sorted = project_bounding_boxes(
+            sort_bounding_boxes(bounding_boxes, sorting), sorting, properties, precision
+        )
+        yield evaluate_with_retry(bb_sorted.toList(batch_limit), max_retries)
+
+        offset += batch_size
+        batch_size = step
+
+
+def obtener_datos_gee_parcial_map(
+    aoi,
+    alert_raster,
+    ee_reducer,
+    pixel_size,
+    min_alert_size_pixels,
+    max_elementos,
+    sorting,
+    grid_size,
+    max_retries=3,
+    properties=None,
+    precision=6,
+):
+    # Only look for the first alerts, the full extraction runs in parallel
+    if max_elementos == 0 or max_elementos > 30:
+        max_elementos = 30
+
+    found = []
+    for batch in iter_partial_bounding_boxes(
+        aoi,
+        alert_raster,
+        ee_reducer,
+        pixel_size,
+        min_alert_size_pixels,
+        sorting,
+        grid_size,
+        max_elementos,
+        max_retries=max_retries,
+        properties=properties,
+        precision=precision,
+    ):
+        found += batch
+        if len(found) >= max_elementos:
+            break
+
+    return sort_features(found, sorting)[:max_elementos]
+
+
+def plan_total_extraction(
+    aoi,
+    alert_raster,
+    pixel_size,
+    start_date=None,
+    end_date=None,
+    window_months=TEMPORAL_WINDOW_MONTHS,
+):
+    """
+    Choose the strategy of a full extraction.
+
+    The extraction is planned from a cheap estimate of its cost (see
+    plan_extraction). Only the extractions too heavy for a single request or a
+    local download, over a date range longer than TEMPORAL_SHARDING_MIN_DAYS, are
+    extracted window by window instead of cell by cell.
+
+    Args:
+        aoi (ee.FeatureCollection): The area of interest.
+        alert_raster (ee.Image): Image whose first band is the alert mask.
+        pixel_size (int): Scale of the vectorization in meters.
+        start_date (str): First date of the alerts (YYYY-MM-DD), None to skip the
+            date windows.
+        end_date (str): Last date of the alerts (YYYY-MM-DD).
+        window_months (int): Length of the date windows in months.
+
+    Returns:
+        dict: The "strategy" ("temporal", "local", "tiled" or "whole"), the
+            "grid_size" in meters (tiled only) and the "reason".
+    """
+    days = 0
+    if start_date and end_date:
+        days = (
+            datetime.strptime(end_date, "%Y-%m-%d")
+            - datetime.strptime(start_date, "%Y-%m-%d")
+        ).days
+
+    plan = plan_extraction(
+        estimate_extraction_cost(aoi, alert_raster, pixel_size), pixel_size
+    )
+    if plan["strategy"] == "tiled" and days > TEMPORAL_SHARDING_MIN_DAYS:
+        plan = {
+            "strategy": "temporal",
+            "grid_size": None,
+            "reason": f"{plan['reason']}, {days} days in windows of "
+            f"{window_months} months",
+        }
+
+    print(
+        f"Extraction strategy: {plan['strategy']}"
+        + (f" (grid size {plan['grid_size']} m)" if plan["grid_size"] else "")
+        + f", {plan['reason']}"
+    )
+    return plan
+
+
+def run_extraction_plan(
+    plan,
+    aoi,
+    alert_raster,
+    ee_reducer,
+    pixel_size,
+    min_alert_size_pixels,
+    max_elementos,
+    sorting,
+    properties=None,
+    precision=6,
+    start_date=None,
+    end_date=None,
+    window_months=TEMPORAL_WINDOW_MONTHS,
+):
+    """
+    Extract the alert bounding boxes with the strategy of plan_total_extraction.
+
+    Args:
+        plan (dict): Output of plan_total_extraction.
+        aoi (ee.FeatureCollection): The area of interest.
+        alert_raster (ee.Image): Image with the bands expected by ee_reducer.
+        ee_reducer (ee.Reducer): Reducer applied to each cluster.
+        pixel_size (int): Scale of the vectorization in meters.
+        min_alert_size_pixels (int): Minimum number of pixels of a cluster.
+        max_elementos (int): Maximum number of alerts returned, 0 for
+            DEFAULT_MAX_ALERTS and None for all of them.
+        sorting (str): Alert sorting method label.
+        properties (list): Properties returned for each alert, see project_bounding_boxes.
+        precision (int): Number of decimals of the returned bbox coordinates.
+        start_date (str): First date of the alerts (YYYY-MM-DD), temporal only.
+        end_date (str): Last date of the alerts (YYYY-MM-DD), temporal only.
+        window_months (int): Length of the date windows in months, temporal only.
+
+    Returns:
+        list: The sorted bounding box features.
+    """
+    if plan["strategy"] == "temporal":
+        return obtener_datos_gee_temporal(
+            aoi,
+            alert_raster,
+            ee_reducer,
+            pixel_size,
+            min_alert_size_pixels,
+            max_elementos,
+            sorting,
+            start_date,
+            end_date,
+            window_months,
+            properties=properties,
+            precision=precision,
+        )
+
+    if plan["strategy"] == "local":
+        return obtener_datos_local_raster(
+            aoi,
+            alert_raster,
+            pixel_size,
+            min_alert_size_pixels,
+            max_elementos,
+            sorting,
+            precision=precision,
+        )
+
+    if plan["strategy"] == "tiled":
+        # Only vectorize the grid cells where the coarse alert mask has alerts
+        return obtener_datos_gee_coarse_to_fine(
+            aoi,
+            alert_raster,
+            ee_reducer,
+            pixel_size,
+            min_alert_size_pixels,
+            max_elementos,
+            sorting,
+            plan["grid_size"],
+            properties=properties,
+            precision=precision,
+        )
+
+    # The adaptive extraction still splits the parts of the AOI that fail
+    return obtener_datos_gee_adaptive(
+        aoi,
+        alert_raster,
+        ee_reducer,
+        pixel_size,
+        min_alert_size_pixels,
+        max_elementos,
+        sorting,
+        properties=properties,
+        precision=precision,
+    )
+
+
+def obtener_datos_gee_total_v3(
+    aoi,
+    alert_raster,
+    ee_reducer,
+    pixel_size,
+    min_alert_size_pixels,
+    max_elementos,
+    sorting,
+    properties=None,
+    precision=6,
+    start_date=None,
+    end_date=None,
+    window_months=TEMPORAL_WINDOW_MONTHS,
+):
+    plan = plan_total_extraction(
+        aoi, alert_raster, pixel_size, start_date, end_date, window_months
+    )
+    return run_extraction_plan(
+        plan,
+        aoi,
+        alert_raster,
+        ee_reducer,
+        pixel_size,
+        min_alert_size_pixels,
+        max_elementos,
+        sorting,
+        properties=properties,
+        precision=precision,
+        start_date=start_date,
+        end_date=end_date,
+        window_months=window_months,
+    )
+
+
+# Function to convert list of polygons to geodataframe
+def convert_to_geopandas(polygon_features):
+    """
+    Convert bounding box features to the alert GeoDataFrame reviewed in the app.
+
+    Boxes (from the compact "bbox" property or the geometry rings) and centroids are
+    built at once with the shapely 2 array functions and the alert types are encoded
+    as an alert source bitmask (see encode_alert_sources).
+
+    Args:
+        polygon_features (list): Bounding box features, as returned by getInfo.
+
+    Returns:
+        gpd.GeoDataFrame: One row per alert with the centroid as "point" geometry.
+    """
+    n = len(polygon_features)
+    bounding_boxes = np.empty(n, dtype=object)
+
+    # Projected features carry their bounds in a compact "bbox" property
+    compact = np.fromiter(
+        ("bbox" in feature["properties"] for feature in polygon_features),
+        dtype=bool,
+        count=n,
+    )
+    if compact.any():
+        bounds = np.array(
+            [
+                polygon_features[i]["properties"]["bbox"]
+                for i in np.flatnonzero(compact)
+            ],
+            dtype=float,
+        )
+        bounding_boxes[compact] = shapely.box(*bounds.T)
+
+    # Build the other bounding boxes from a single coordinate array
+    ring_features = np.flatnonzero(~compact)
+    rings = [polygon_features[i]["geometry"]["coordinates"][0] for i in ring_features]
+    ring_sizes = np.fromiter(
+        (len(ring) for ring in rings), dtype=np.int64, count=len(rings)
+    )
+    coordinates = np.array(
+        [point for ring in rings for point in ring], dtype=float
+    ).reshape(-1, 2)
+    if len(rings) and (ring_sizes == ring_sizes[0]).all():
+        # reduceToVectors boxes all have the same number of vertices
+        bounding_boxes[ring_features] = shapely.polygons(
+            coordinates.reshape(len(rings), ring_sizes[0], 2)
+        )
+    elif len(rings):
+        bounding_boxes[ring_features] = shapely.polygons(
+            shapely.linearrings(
+                coordinates, indices=np.repeat(np.arange(len(rings)), ring_sizes)
+            )
+        )
+    points = shapely.centroid(bounding_boxes)
+
+    # Extract properties and add relevant information
+    properties = pd.DataFrame.from_records(
+        [feature["properties"] for feature in polygon_features]
+    ).drop(columns="bbox", errors="ignore")
+    properties["gee_id"] = [feature["id"] for feature in polygon_features]
+    properties["bounding_box"] = bounding_boxes
+
+    # Create GeoDataFrame
+    gdf = gpd.GeoDataFrame(properties, geometry=gpd.GeoSeries(points), crs=None)
+    gdf = gdf.rename_geometry("point")
+
+    # Store the alert sources as a bitmask, decoded only when displayed
+    index = gdf.index
+    alert_source_mask = pd.Series(0, index=index, dtype="int64")
+    if "alert_type_unique" in gdf:
+        alert_source_mask[:] = encode_alert_sources(gdf["alert_type_unique"])
+    if "alert_source_mask" in gdf:
+        reduced = gdf["alert_source_mask"].notna()
+        alert_source_mask[reduced] = gdf.loc[reduced, "alert_source_mask"]
+    gdf["alert_source_mask"] = alert_source_mask
 
     # Add additional columns with default values
-    gdf["status"] = "Not reviewed"
-    #gdf["alert_sources"] = pd.Series([],dtype="str")
-    gdf["alert_sources"] = gdf["alert_type_unique"].apply(lambda x: format_list(get_unique_alerts(x)))
-    gdf["before_img"] = pd.Series([],dtype="str")
-    gdf["before_img_info"] = pd.Series([],dtype="object")
-    gdf["after_img"] = pd.Series([],dtype="str")
-    gdf["after_img_info"] = pd.Series([],dtype="object")
-    gdf["alert_polygon"] = pd.Series([],dtype="object")
-    gdf["area_ha"] = pd.Series([],dtype="float")
-    gdf["description"] = pd.Series([],dtype="str")
-    gdf["admin1"] = pd.Series([],dtype="str")
-    gdf["admin2"] = pd.Series([],dtype="str")
-    gdf["admin3"] = pd.Series([],dtype="str")
-
-    # Save gdf to file
-    # gdf.set_crs(epsg = '4326', allow_override=True, inplace=True).to_file(gpkg_name, driver='GPKG')
-
-    #Drop unnecessary columns
-    gdf.drop('label', axis=1, inplace=True)
-
-    # Check result
+    gdf["status"] = pd.Series("Not reviewed", index=index, dtype="object")
+    gdf["before_img"] = pd.Series(pd.NA, index=index, dtype="string")
+    gdf["before_img_info"] = pd.Series(None, index=index, dtype="object")
+    gdf["after_img"] = pd.Series(pd.NA, index=index, dtype="string")
+    gdf["after_img_info"] = pd.Series(None, index=index, dtype="object")
+    gdf["alert_polygon"] = pd.Series(None, index=index, dtype="object")
+    gdf["area_ha"] = pd.Series(np.nan, index=index, dtype="float64")
+    gdf["description"] = pd.Series(pd.NA, index=index, dtype="string")
+    gdf["admin1"] = pd.Series(pd.NA, index=index, dtype="string")
+    gdf["admin2"] = pd.Series(pd.NA, index=index, dtype="string")
+    gdf["admin3"] = pd.Series(pd.NA, index=index, dtype="string")
+
+    # Drop unnecessary columns
+    gdf.drop(columns=["label", "alert_type_unique"], errors="ignore", inplace=True)
+
     return gdf
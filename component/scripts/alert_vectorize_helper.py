@@ -0,0 +1,390 @@
+"""Local vectorization of alert rasters downloaded as NumPy arrays.
+
+These functions reproduce the bounding boxes of reduceToVectors(geometryType="bb",
+eightConnected=True) on the client side, they don't depend on Earth Engine so they
+can be run on synthetic rasters.
+"""
+
+import numpy as np
+
+
+def label_components(mask):
+    """
+    Label the 8-connected components of a boolean mask.
+
+    Every pixel starts with its own index as label. At each step the root of each
+    pixel is hooked to the smallest label of its 3x3 neighbourhood and the labels are
+    compressed with pointer jumping, all steps being whole array operations.
+
+    Args:
+        mask (np.ndarray): 2D boolean array, True for alert pixels.
+
+    Returns:
+        tuple: (labels, n) where labels is an int array with 0 for background and
+            1..n for the components.
+    """
+    mask = np.asarray(mask, dtype=bool)
+    height, width = mask.shape
+    background = height * width
+    labels = np.where(mask.ravel(), np.arange(background), background)
+    nodes = np.flatnonzero(mask)
+
+    while True:
+        grid = labels.reshape(height, width)
+        padded = np.pad(grid, 1, constant_values=background)
+        neighbours = grid.copy()
+        for dy in range(3):
+            for dx in range(3):
+                np.minimum(
+                    neighbours,
+                    padded[dy : dy + height, dx : dx + width],
+                    out=neighbours,
+                )
+
+        smallest = neighbours.ravel()[nodes]
+        current = labels[nodes]
+        changed = smallest < current
+        if not changed.any():
+            break
+
+        # hook the root of each pixel to the smallest neighbouring label
+        np.minimum.at(labels, current[changed], smallest[changed])
+        labels[nodes] = np.minimum(labels[nodes], smallest)
+
+        # pointer jumping until every pixel points to its root
+        while True:
+            jumped = labels[labels[nodes]]
+            if np.array_equal(jumped, labels[nodes]):
+                break
+            labels[nodes] = jumped
+
+    output = np.zeros(background, dtype=np.int64)
+    if len(nodes):
+        _, inverse = np.unique(labels[nodes], return_inverse=True)
+        output[nodes] = inverse + 1
+    output = output.reshape(height, width)
+
+    return output, int(output.max())
+
+
+def summarize_components(labels, alert, date, row_offset=0, col_offset=0):
+    """
+    Compute the cluster statistics of labelled components.
+
+    Args:
+        labels (np.ndarray): Output of label_components.
+        alert (np.ndarray): The alert source band (bitmask), same shape as labels.
+        date (np.ndarray): The date band (YYYY.ddd), same shape as labels.
+        row_offset (int): Row of the array in the full raster.
+        col_offset (int): Column of the array in the full raster.
+
+    Returns:
+        dict: Arrays of count, date_min, date_max, row_min, row_max, col_min, col_max
+            (one item per component, component i is at index i - 1) and alert_pairs,
+            a (2, m) array of distinct (component index, alert value) pairs.
+    """
+    width = labels.shape[1]
+    pixels = np.flatnonzero(labels)
+    component = labels.ravel()[pixels]
+
+    # group the pixels of each component together
+    order = np.argsort(component, kind="stable")
+    pixels = pixels[order]
+    component = component[order]
+    starts = np.flatnonzero(np.r_[True, component[1:] != component[:-1]])
+
+    rows = pixels // width + row_offset
+    cols = pixels % width + col_offset
+    dates = np.asarray(date).ravel()[pixels]
+    alerts = np.asarray(alert).ravel()[pixels].astype(np.int64)
+
+    if len(pixels) == 0:
+        empty = np.zeros(0)
+        return {
+            "count": empty.astype(np.int64),
+            "date_min": empty,
+            "date_max": empty,
+            "row_min": empty.astype(np.int64),
+            "row_max": empty.astype(np.int64),
+            "col_min": empty.astype(np.int64),
+            "col_max": empty.astype(np.int64),
+            "alert_pairs": np.zeros((2, 0), dtype=np.int64),
+        }
+
+    return {
+        "count": np.diff(np.r_[starts, len(pixels)]),
+        "date_min": np.minimum.reduceat(dates, starts),
+        "date_max": np.maximum.reduceat(dates, starts),
+        "row_min": np.minimum.reduceat(rows, starts),
+        "row_max": np.maximum.reduceat(rows, starts),
+        "col_min": np.minimum.reduceat(cols, starts),
+        "col_max": np.maximum.reduceat(cols, starts),
+        "alert_pairs": np.unique(np.stack([component - 1, alerts]), axis=1),
+    }
+
+
+def merge_summaries(summary, groups):
+    """
+    Merge the statistics of components that belong to the same cluster.
+
+    Args:
+        summary (dict): Output of summarize_components.
+        groups (np.ndarray): Group id of each component.
+
+    Returns:
+        dict: The statistics of each group, with the same keys as summary.
+    """
+    _, inverse = np.unique(groups, return_inverse=True)
+    n = inverse.max() + 1 if len(inverse) else 0
+
+    def reduce(ufunc, values, initial):
+        output = np.full(n, initial, dtype=values.dtype)
+        ufunc.at(output, inverse, values)
+        return output
+
+    alert_pairs = summary["alert_pairs"]
+    return {
+        "count": np.bincount(inverse, weights=summary["count"], minlength=n).astype(
+            np.int64
+        ),
+        "date_min": reduce(np.minimum, summary["date_min"], np.inf),
+        "date_max": reduce(np.maximum, summary["date_max"], -np.inf),
+        "row_min": reduce(np.minimum, summary["row_min"], np.iinfo(np.int64).max),
+        "row_max": reduce(np.maximum, summary["row_max"], np.iinfo(np.int64).min),
+        "col_min": reduce(np.minimum, summary["col_min"], np.iinfo(np.int64).max),
+        "col_max": reduce(np.maximum, summary["col_max"], np.iinfo(np.int64).min),
+        "alert_pairs": np.unique(
+            np.stack([inverse[alert_pairs[0]], alert_pairs[1]]), axis=1
+        ),
+    }
+
+
+def summary_to_features(summary, transform, min_alert_size_pixels=0, id_prefix="local"):
+    """
+    Convert component statistics to bounding box features.
+
+    The features follow the schema returned by reduceToVectors with the module
+    custom reducer, so they can be used by convert_to_geopandas.
+
+    Args:
+        summary (dict): Output of summarize_components or merge_summaries.
+        transform (tuple): (x_origin, pixel_width, y_origin, pixel_height) of the raster,
+            pixel_height is negative for north-up rasters.
+        min_alert_size_pixels (int): Minimum number of pixels of a cluster.
+        id_prefix (str): Prefix of the feature ids.
+
+    Returns:
+        list: The bounding box features.
+    """
+    x_origin, pixel_width, y_origin, pixel_height = transform
+
+    # bitwise OR of the alert sources of each cluster
+    alert_pairs = summary["alert_pairs"]
+    alert_masks = np.zeros(len(summary["count"]), dtype=np.int64)
+    np.bitwise_or.at(alert_masks, alert_pairs[0], alert_pairs[1])
+    alert_masks = alert_masks.tolist()
+
+    x1 = x_origin + summary["col_min"] * pixel_width
+    x2 = x_origin + (summary["col_max"] + 1) * pixel_width
+    y1 = y_origin + summary["row_min"] * pixel_height
+    y2 = y_origin + (summary["row_max"] + 1) * pixel_height
+    xmin, xmax = np.minimum(x1, x2).tolist(), np.maximum(x1, x2).tolist()
+    ymin, ymax = np.minimum(y1, y2).tolist(), np.maximum(y1, y2).tolist()
+
+    features = []
+    for i, count in enumerate(summary["count"].tolist()):
+        if count < min_alert_size_pixels:
+            continue
+        features.append(
+            {
+                "type": "Feature",
+                "id": f"{id_prefix}_{i}",
+                "geometry": {
+                    "type": "Polygon",
+                    "coordinates": [
+                        [
+                            [xmin[i], ymin[i]],
+                            [xmax[i], ymin[i]],
+                            [xmax[i], ymax[i]],
+                            [xmin[i], ymax[i]],
+                            [xmin[i], ymin[i]],
+                        ]
+                    ],
+                },
+                "properties": {
+                    "label": 1,
+                    "count": count,
+                    "alert_date_min": float(summary["date_min"][i]),
+                    "alert_date_max": float(summary["date_max"][i]),
+                    "alert_source_mask": alert_masks[i],
+                },
+            }
+        )
+    return features
+
+
+def vectorize_alert_arrays(alert, date, transform, min_alert_size_pixels=0):
+    """
+    Vectorize a single alert raster held in memory.
+
+    Args:
+        alert (np.ndarray): The alert source band (bitmask), 0 or nan where there
+            is no alert.
+        date (np.ndarray): The date band (YYYY.ddd).
+        transform (tuple): (x_origin, pixel_width, y_origin, pixel_height) of the raster.
+        min_alert_size_pixels (int): Minimum number of pixels of a cluster.
+
+    Returns:
+        list: The bounding box features.
+    """
+    alert = np.nan_to_num(np.asarray(alert, dtype=float))
+    labels, _ = label_components(alert > 0)
+    summary = summarize_components(labels, alert, date)
+    return summary_to_features(summary, transform, min_alert_size_pixels)
+
+
+def _seam_pairs(first, second):
+    """Return the 8-connected label pairs between two facing edges of labels."""
+    pairs = []
+    for shift in (-1, 0, 1):
+        if shift < 0:
+            a, b = first[-shift:], second[:shift]
+        elif shift > 0:
+            a, b = first[:-shift], second[shift:]
+        else:
+            a, b = first, second
+        connected = (a > 0) & (b > 0)
+        pairs.append(np.stack([a[connected], b[connected]]))
+    return np.concatenate(pairs, axis=1)
+
+
+def _find_root(parents, node):
+    """Find the root of a node in a union-find parent array, with path halving."""
+    while parents[node] != node:
+        parents[node] = parents[parents[node]]
+        node = parents[node]
+    return node
+
+
+def summarize_alert_tile(alert, date, row_offset=0, col_offset=0):
+    """
+    Label a single tile and keep only what the seam merge needs.
+
+    Args:
+        alert (np.ndarray): The alert source band (bitmask) of the tile, 0 or nan
+            where there is no alert.
+        date (np.ndarray): The date band (YYYY.ddd) of the tile.
+        row_offset (int): Row of the tile in the full raster.
+        col_offset (int): Column of the tile in the full raster.
+
+    Returns:
+        tuple: (summary, edges) where summary is the output of summarize_components
+            and edges holds the tile labels of its top, bottom, left and right lines.
+    """
+    alert = np.nan_to_num(np.asarray(alert))
+    labels, _ = label_components(alert > 0)
+    summary = summarize_components(labels, alert, date, row_offset, col_offset)
+    edges = {
+        "top": labels[0].copy(),
+        "bottom": labels[-1].copy(),
+        "left": labels[:, 0].copy(),
+        "right": labels[:, -1].copy(),
+    }
+    return summary, edges
+
+
+def merge_alert_tiles(tile_summaries, transform, min_alert_size_pixels=0):
+    """
+    Merge the tile summaries of a raster into bounding box features.
+
+    The components touching each other across tile edges are merged so a cluster
+    crossing a seam gives a single box.
+
+    Args:
+        tile_summaries (dict): {(tile_row, tile_col): (summary, edges)} as returned by
+            summarize_alert_tile.
+        transform (tuple): (x_origin, pixel_width, y_origin, pixel_height) of tile (0, 0).
+        min_alert_size_pixels (int): Minimum number of pixels of a cluster.
+
+    Returns:
+        list: The bounding box features.
+    """
+    summaries = []
+    edges = {}
+    offset = 0
+    for tile, (summary, tile_edges) in tile_summaries.items():
+        summaries.append(summary)
+        # give the edges global component ids to find the seams
+        edges[tile] = {
+            side: np.where(labels > 0, labels + offset, 0)
+            for side, labels in tile_edges.items()
+        }
+        offset += len(summary["count"])
+
+    if offset == 0:
+        return []
+
+    summary = {}
+    for key in summaries[0]:
+        if key == "alert_pairs":
+            pairs, shift = [], 0
+            for item in summaries:
+                pairs.append(item[key] + np.array([[shift], [0]]))
+                shift += len(item["count"])
+            summary[key] = np.concatenate(pairs, axis=1)
+        else:
+            summary[key] = np.concatenate([item[key] for item in summaries])
+
+    seams = []
+    for (tile_row, tile_col), edge in edges.items():
+        right = edges.get((tile_row, tile_col + 1))
+        if right is not None:
+            seams.append(_seam_pairs(edge["right"], right["left"]))
+        below = edges.get((tile_row + 1, tile_col))
+        if below is not None:
+            seams.append(_seam_pairs(edge["bottom"], below["top"]))
+        # diagonal neighbours only touch through their corner pixel
+        below_right = edges.get((tile_row + 1, tile_col + 1))
+        if below_right is not None and edge["bottom"][-1] and below_right["top"][0]:
+            seams.append(np.array([[edge["bottom"][-1]], [below_right["top"][0]]]))
+        below_left = edges.get((tile_row + 1, tile_col - 1))
+        if below_left is not None and edge["bottom"][0] and below_left["top"][-1]:
+            seams.append(np.array([[edge["bottom"][0]], [below_left["top"][-1]]]))
+
+    parents = list(range(offset + 1))
+    if seams:
+        for a, b in np.unique(np.concatenate(seams, axis=1), axis=1).T.tolist():
+            root_a, root_b = _find_root(parents, a), _find_root(parents, b)
+            if root_a != root_b:
+                parents[max(root_a, root_b)] = min(root_a, root_b)
+    groups = np.array([_find_root(parents, i) for i in range(1, offset + 1)])
+
+    return summary_to_features(
+        merge_summaries(summary, groups), transform, min_alert_size_pixels
+    )
+
+
+def vectorize_alert_tiles(tiles, tile_size, transform, min_alert_size_pixels=0):
+    """
+    Vectorize an alert raster downloaded as a grid of tiles.
+
+    Every tile is labelled on its own (see summarize_alert_tile) and the tiles are
+    then merged across their edges (see merge_alert_tiles).
+
+    Args:
+        tiles (dict): {(tile_row, tile_col): (alert_source, date)} arrays of tile_size x tile_size
+            pixels (edge tiles can be smaller).
+        tile_size (int): Size of the full tiles in pixels.
+        transform (tuple): (x_origin, pixel_width, y_origin, pixel_height) of tile (0, 0).
+        min_alert_size_pixels (int): Minimum number of pixels of a cluster.
+
+    Returns:
+        list: The bounding box features.
+    """
+    tile_summaries = {
+        (tile_row, tile_col): summarize_alert_tile(
+            alert, date, tile_row * tile_size, tile_col * tile_size
+        )
+        for (tile_row, tile_col), (alert, date) in tiles.items()
+    }
+    return merge_alert_tiles(tile_summaries, transform, min_alert_size_pixels)
@@ -1,12 +1,16 @@
 import ee
 from sepal_ui.scripts import utils as su
 from sepal_ui.scripts.utils import init_ee
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date
+from functools import lru_cache
 from math import floor, ceil
 import geopandas as gpd
 import ee
 import pandas as pd
 from component.message import cm
+from component.scripts.ee_helper import CACHE_TTLS, evaluate_cached, memoize_ee
 
 init_ee()
 
@@ -62,8 +66,9 @@ def date_range_check(
 
 def aoi_filterbounds_check(collection, aoi):
     """Checks if user aoi intersects collection."""
-    aoi_test = (
-        ee.ImageCollection(collection).filterBounds(aoi).limit(2).size().getInfo()
+    aoi_test = evaluate_cached(
+        ee.ImageCollection(collection).filterBounds(aoi).limit(2).size(),
+        CACHE_TTLS["latest_date"],
     )
     if aoi_test > 0:
         return "Pass"
@@ -71,78 +76,85 @@ def aoi_filterbounds_check(collection, aoi):
         return "Fail: No alerts found on AOI"
 
 
+# Collections and first dates of the alert sources
+ALERT_COLLECTIONS = {
+    "GLAD-L": "projects/glad/alert/2018final",
+    "RADD": "projects/radar-wur/raddalert/v1",
+    "GLAD-S2": "projects/glad/S2alert",
+}
+ALERT_START_DATES = {
+    "GLAD-L": "2018-01-01",
+    "RADD": "2019-01-01",
+    "GLAD-S2": "2019-01-01",
+}
+
+
+def get_alert_metadata():
+    """
+    Retrieve the metadata of the alert collections in a single cached request.
+
+    Returns:
+        dict: The end dates (YYYY-MM-DD) of GLAD-L, RADD and GLAD-S2 and the band
+            names of the GLAD-L updated collection ("glad_l_bands").
+    """
+    glad_l = ee.ImageCollection("projects/glad/alert/UpdResult")
+    radd = ee.ImageCollection("projects/radar-wur/raddalert/v1").filterMetadata(
+        "layer", "contains", "alert"
+    )
+    metadata = ee.Dictionary(
+        {
+            "GLAD-L": ee.Date(
+                glad_l.sort("system:time_start", False).first().get("system:time_start")
+            ).format("yyyy-MM-dd"),
+            "RADD": radd.sort("system:time_end", False).first().get("version_date"),
+            "GLAD-S2": ee.Image("projects/glad/S2alert/alert").get("date"),
+            "glad_l_bands": glad_l.first().bandNames(),
+        }
+    )
+    return evaluate_cached(metadata, CACHE_TTLS["latest_date"])
+
+
 def get_alert_dates_GLAD_L():
     """Retrieve start and end dates for GLAD L collection."""
-    start_date = "2018-01-01"
-    end_date = (
-        ee.Date(
-            ee.ImageCollection("projects/glad/alert/UpdResult")
-            .sort("system:time_start", False)
-            .first()
-            .get("system:time_start")
-        )
-        .format("yyyy-MM-dd")
-        .getInfo()
-    )
-    return [start_date, end_date]
+    return [ALERT_START_DATES["GLAD-L"], get_alert_metadata()["GLAD-L"]]
 
 
 def get_alert_dates_ccdc(alert_collection):
     """Retrieve start and end dates for an CCDC alert collection."""
-    start_date = (
-        ee.Date(ee.Image(alert_collection).get("system:time_start"))
-        .format("yyyy-MM-dd")
-        .getInfo()
-    )
-    end_date = (
-        ee.Date(ee.Image(alert_collection).get("system:time_end"))
-        .format("yyyy-MM-dd")
-        .getInfo()
+    image = ee.Image(alert_collection)
+    dates = ee.List(
+        [
+            ee.Date(image.get("system:time_start")).format("yyyy-MM-dd"),
+            ee.Date(image.get("system:time_end")).format("yyyy-MM-dd"),
+        ]
     )
-    return [start_date, end_date]
+    return evaluate_cached(dates, CACHE_TTLS["latest_date"])
 
 
 def get_alert_dates_GLAD_S2():
     """Retrieve start and end dates for GLAD S2 collection."""
-    start_date = "2019-01-01"
-    end_date = ee.Image("projects/glad/S2alert/alert").get("date").getInfo()
-    return [start_date, end_date]
+    return [ALERT_START_DATES["GLAD-S2"], get_alert_metadata()["GLAD-S2"]]
 
 
 def get_alert_dates_RADD():
     """Retrieve start and end dates for RADD collection."""
-    radd = ee.ImageCollection("projects/radar-wur/raddalert/v1").filterMetadata(
-        "layer", "contains", "alert"
-    )
-    start_date = "2019-01-01"
-    end_date = radd.sort("system:time_end", False).first().get("version_date").getInfo()
-    return [start_date, end_date]
+    return [ALERT_START_DATES["RADD"], get_alert_metadata()["RADD"]]
 
 
 def create_basic_alerts_dictionary():
     """Create dictiionary with start and end dates for alert collections."""
 
-    dates_gladL = get_alert_dates_GLAD_L()
-    dates_gladS2 = get_alert_dates_GLAD_S2()
-    dates_radd = get_alert_dates_RADD()
+    # all the end dates come from a single request
+    metadata = get_alert_metadata()
 
     # Define alert metadata in a dictionary
     alert_metadata = {
-        "GLAD-L": {
-            "collection": "projects/glad/alert/2018final",
-            "start_date": dates_gladL[0],
-            "end_date": dates_gladL[1],
-        },
-        "RADD": {
-            "collection": "projects/radar-wur/raddalert/v1",
-            "start_date": dates_radd[0],
-            "end_date": dates_radd[1],
-        },
-        "GLAD-S2": {
-            "collection": "projects/glad/S2alert",
-            "start_date": dates_gladS2[0],
-            "end_date": dates_gladS2[1],
-        },
+        name: {
+            "collection": collection,
+            "start_date": ALERT_START_DATES[name],
+            "end_date": metadata[name],
+        }
+        for name, collection in ALERT_COLLECTIONS.items()
     }
     return alert_metadata
 
@@ -164,44 +176,77 @@ def remove_ccdc_alerts_dictionary(alert_metadata):
     return alert_metadata
 
 
-def create_available_alert_dictionary(dataset, aoi, date1, date2):
-    """Perform test over alert collection to check date and aoi availability"""
-    result = []
+def get_aoi_alert_counts(dataset, aoi):
+    """
+    Check which alert collections intersect the aoi in a single request.
+
+    Args:
+        dataset (dict): Alert metadata, as created by create_basic_alerts_dictionary.
+        aoi (ee.FeatureCollection): The selected aoi.
+
+    Returns:
+        dict: The number of images (up to 2) intersecting the aoi per collection name.
+    """
+    counts = {}
     for name, data in dataset.items():
-        start_date = data["start_date"]
-        end_date = data["end_date"]
         if name == "CCDC":
             collection = ee.ImageCollection.fromImages([ee.Image(data["collection"])])
         else:
-            collection = data["collection"]
+            collection = ee.ImageCollection(data["collection"])
+        counts[name] = collection.filterBounds(aoi).limit(2).size()
 
-        # Apply the functions
-        check1 = date_range_check(date1, date2, start_date, end_date)
-        check2 = aoi_filterbounds_check(collection, aoi)
-        if check1 == "Pass" and check2 == "Pass":
-            result.append(name)
-        else:
-            result
-    return result
+    if not counts:
+        return {}
+    return evaluate_cached(ee.Dictionary(counts), CACHE_TTLS["latest_date"])
+
+
+def create_available_alert_dictionary(dataset, aoi, date1, date2):
+    """Perform test over alert collection to check date and aoi availability"""
+    # the date checks are done first so only the remaining collections are requested
+    in_dates = {
+        name: data
+        for name, data in dataset.items()
+        if date_range_check(date1, date2, data["start_date"], data["end_date"])
+        == "Pass"
+    }
+    counts = get_aoi_alert_counts(in_dates, aoi)
+    return [name for name in in_dates if counts[name] > 0]
+
+
+# Executor shared by the preparation of the alert sources
+SOURCE_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="alert_source")
 
 
 def create_filtered_alert_raster_dictionary(
     dataset, aoi, start_date, end_date, ccdc_asset
 ):
     """Return dictionary of filtered available alert rasters"""
-    result = {}
-    for nombre in dataset:
+    # the sources are prepared concurrently as some of them do blocking requests
+    def prepare_source(nombre):
+        start_time = time.perf_counter()
         raster = get_alerts(nombre, start_date, end_date, aoi, ccdc_asset)
-        result[nombre] = {"alert_raster": raster}
+        return raster, time.perf_counter() - start_time
+
+    futures = {
+        nombre: SOURCE_EXECUTOR.submit(prepare_source, nombre) for nombre in dataset
+    }
+
+    result = {}
+    for nombre, future in futures.items():
+        raster, preparation_time = future.result()
+        print(f"{nombre} alerts prepared in {preparation_time:.2f} seconds")
+        result[nombre] = {"alert_raster": raster, "preparation_time": preparation_time}
     return result
 
 
 # functions taken from https://github.com/sepal-contrib/alert_module/blob/main/component/scripts/alert.py
 
 
+@memoize_ee()
 def get_alerts(collection, start, end, aoi, asset):
     """
     get the alerts restricted to the aoi and the specified dates.
+    The images are memoized on the arguments and the aoi graph.
     The Returned images will embed mandatory and optional bands:
     madatory:
         "alert": the alert value 1 for alerts,2 for potential, 0 for no_alerts
@@ -232,21 +277,12 @@ def get_alerts(collection, start, end, aoi, asset):
     return alerts
 
 
-def to_date(dates):
-    """
-    transform a date store as (int) number of days since 2018-12-31 to a date in YYYY.ddd
-    adapted from https:#gis.stackexchange.com/a/428770/154945 to tackle the GLAD_S2 date format
-    """
-
-    reference_year = ee.Number(2018)
-
-    # compute the approximate number of year
-    years = dates.add(364).divide(365).floor().add(reference_year)
-
-    # compute a leap year image
-    leap_years = ee.Image(
+@lru_cache(maxsize=None)
+def get_leap_years_image(reference_year=2018, last_year=2070):
+    """Return an ee.Array image of the leap years between reference_year and last_year."""
+    return ee.Image(
         ee.Array(
-            ee.List.sequence(reference_year, 2070)
+            ee.List.sequence(reference_year, last_year)
             .map(
                 lambda y: (
                     ee.Date.fromYMD(ee.Number(y).add(1), 1, 1)  # last of year
@@ -262,6 +298,21 @@ def to_date(dates):
         )
     )
 
+
+def to_date(dates):
+    """
+    transform a date store as (int) number of days since 2018-12-31 to a date in YYYY.ddd
+    adapted from https:#gis.stackexchange.com/a/428770/154945 to tackle the GLAD_S2 date format
+    """
+
+    reference_year = ee.Number(2018)
+
+    # compute the approximate number of year
+    years = dates.add(364).divide(365).floor().add(reference_year)
+
+    # compute a leap year image
+    leap_years = get_leap_years_image()
+
     # Mask out leap years after the year of the pixel
     # Results in an image where the pixel value represents the number of leap years
     nb_leap_years = leap_years.arrayMask(leap_years.lte(years)).arrayLength(0)
@@ -289,12 +340,81 @@ def to_date(dates):
     return years.add(dates.divide(1000))
 
 
+@lru_cache(maxsize=None)
+def get_glad_l_updated_year():
+    """Return the first year of the GLAD-L updated collection, from its alertDateXX bands."""
+    bands = get_alert_metadata()["glad_l_bands"]
+    alert_date_bands = [band for band in bands if band.startswith("alertDate")]
+    modified_list = [element.replace("alertDate", "") for element in alert_date_bands]
+    numeric_values = [int(value) for value in modified_list]
+    return 2000 + min(numeric_values)
+
+
+@lru_cache(maxsize=256)
+def _glad_l_year_composite(year, start, end, updated_year):
+    """
+    Build the GLAD-L alert and date composite of a period within a year.
+
+    The images are immutable graphs so they are memoized and shared between calls.
+
+    Args:
+        year (int): The year of the period.
+        start (int): The first day of the period, excluded (day of year).
+        end (int): The last day of the period, excluded (day of year).
+        updated_year (int): The first year of the GLAD-L updated collection.
+
+    Returns:
+        (ee.Image) the "alert" and "date" bands of the period
+    """
+    if year < updated_year:
+        source = f"projects/glad/alert/{year}final"
+    else:
+        source = "projects/glad/alert/UpdResult"
+
+    # the number of bands throughout the ImageCollection is not consisitent
+    # remove the extra useless one before any operation
+    bands = [f"conf{year%100}", f"alertDate{year%100}", "obsCount", "obsDate"]
+
+    # create the composit band alert_date.
+    # cannot use the alertDateXX band directly because
+    # they are not all casted to the same type
+    alerts = (
+        ee.ImageCollection(source)
+        .select(bands)
+        .map(lambda image: image.uint16())
+        .mosaic()
+    )
+    alerts = alerts.updateMask(
+        alerts.select(f"alertDate{year%100}")
+        .gt(start)
+        .And(alerts.select(f"alertDate{year%100}").lt(end))
+    )
+
+    # create a unique alert band
+    alert_band = (
+        alerts.select(f"conf{year%100}")
+        .remap([0, 1, 2, 3], [0, 0, 2, 1])
+        .toInt16()
+        .rename("alert")
+    )
+
+    # change the date format
+    date_band = (
+        alerts.select(f"alertDate{year%100}")
+        .divide(1000)
+        .add(ee.Image(year))
+        .toFloat()
+        .rename("date")
+    )
+
+    return alert_band.addBands(date_band)
+
+
 def _from_glad_l(start, end, aoi):
     """reformat the glad alerts to fit the module expectation"""
 
     # glad is not compatible with multi year analysis so we cut the dataset into
     # yearly pieces and merge thm together in a second step
-    # as it includes multiple dataset I'm not sure I can perform it without a python for loop
 
     # cut the interval into yearly pieces
     start = datetime.strptime(start, "%Y-%m-%d")
@@ -309,71 +429,17 @@ def _from_glad_l(start, end, aoi):
         tmp = periods.pop()
     periods.append(tmp)
 
-    collection = ee.ImageCollection("projects/glad/alert/UpdResult")
-    first_image = collection.first()
-    bands = first_image.bandNames().getInfo()
-    alert_date_bands = [band for band in bands if band.startswith("alertDate")]
-    modified_list = [element.replace("alertDate", "") for element in alert_date_bands]
-    numeric_values = [int(value) for value in modified_list]
-    lowest_digit = 2000 + min(numeric_values)
-
-    images = []
-    for period in periods:
-        year = period[0].year
-        start = period[0].timetuple().tm_yday
-        end = period[1].timetuple().tm_yday
-
-        if year < lowest_digit:
-            source = f"projects/glad/alert/{year}final"
-        else:
-            source = "projects/glad/alert/UpdResult"
-
-        # the number of bands throughout the ImageCollection is not consisitent
-        # remove the extra useless one before any operation
-        bands = [f"conf{year%100}", f"alertDate{year%100}", "obsCount", "obsDate"]
-
-        # create the composit band alert_date.
-        # cannot use the alertDateXX band directly because
-        # they are not all casted to the same type
-        alerts = (
-            ee.ImageCollection(source)
-            .select(bands)
-            .map(lambda image: image.uint16())
-            .filterBounds(aoi)
-            .mosaic()
-        )
-        alerts = alerts.updateMask(
-            alerts.select(f"alertDate{year%100}")
-            .gt(start)
-            .And(alerts.select(f"alertDate{year%100}").lt(end))
+    # the yearly composites don't depend on the aoi, it is only clipped at the end
+    updated_year = get_glad_l_updated_year()
+    images = [
+        _glad_l_year_composite(
+            period[0].year,
+            period[0].timetuple().tm_yday,
+            period[1].timetuple().tm_yday,
+            updated_year,
         )
-
-        # create a unique alert band
-        alert_band = (
-            alerts.select(f"conf{year%100}")
-            .remap([0, 1, 2, 3], [0, 0, 2, 1])
-            .toInt16()
-            .rename("alert")
-        )
-
-        # change the date format
-        date_band = (
-            alerts.select(f"alertDate{year%100}")
-            .divide(1000)
-            .add(ee.Image(year))
-            .toFloat()
-            .rename("date")
-        )
-
-        # create the composite
-        composite = (
-            alert_band
-            # alerts.select(["obsCount", "obsDate"])
-            .addBands(date_band)
-            # .addBands(alert_band)
-        )
-
-        images += [composite]
+        for period in periods
+    ]
 
     all_alerts = ee.ImageCollection.fromImages(images).mosaic()
 
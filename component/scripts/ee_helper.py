@@ -0,0 +1,461 @@
+import copy
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from functools import wraps
+
+from component.parameter import directory
+
+
+# EE errors worth retrying: time outs, concurrency limits, quotas and server errors
+RETRYABLE_ERRORS = (
+    "Computation timed out",
+    "Too many concurrent aggregations",
+    "Too Many Requests",
+    "Quota exceeded",
+    "Rate Limit Exceeded",
+    "Service Unavailable",
+    "Internal error",
+)
+
+# HTTP status codes worth retrying, read from the error or its "HttpError <code>" message
+RETRYABLE_STATUS_CODES = (429, 503)
+HTTP_STATUS_PATTERN = re.compile(r"\bHttpError (\d{3})\b")
+
+# EE errors raised when a region is too heavy to be processed in a single request,
+# a cell failing with one of them is split in 4 instead of being retried as is
+SPLITTABLE_ERRORS = (
+    "Computation timed out",
+    "Too many pixels",
+    "User memory limit exceeded",
+    "Output of image computation is too large",
+)
+
+
+def is_splittable_error(error):
+    """Check if an EE error can be solved by processing a smaller region."""
+    return any(message in str(error) for message in SPLITTABLE_ERRORS)
+
+
+def get_status_code(error):
+    """Return the HTTP status code of an error, None if it has none."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "resp", None), "status", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if status is None:
+        match = HTTP_STATUS_PATTERN.search(str(error))
+        status = match.group(1) if match else None
+    try:
+        return int(status)
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """
+    Retry policy for the EE requests, with exponential backoff and jitter.
+
+    Only the errors listed in retryable_errors or with a retryable HTTP status code
+    are retried, the others are raised at once. Every attempt holds a slot of a
+    semaphore shared by the whole process so the concurrent threads don't exceed
+    the EE concurrency limits, the waits between attempts don't hold any slot.
+    Calls, retries and failures are counted in stats, the errors by class (see
+    classify_error).
+
+    Args:
+        max_retries (int): Default maximum number of attempts of a call.
+        base_delay (float): Delay before the first retry in seconds, doubled at each retry.
+        max_delay (float): Maximum delay between two attempts in seconds.
+        jitter (float): Relative random variation of the delays, between 0 and 1.
+        max_concurrent (int): Maximum number of requests running at the same time.
+        retryable_errors (tuple): Messages of the errors that are retried.
+        retryable_status_codes (tuple): HTTP status codes of the errors that are retried.
+        sleep (callable): Function used to wait, replaced in tests.
+        random_function (callable): Function returning a float in [0, 1), replaced in tests.
+    """
+
+    def __init__(
+        self,
+        max_retries=5,
+        base_delay=3,
+        max_delay=60,
+        jitter=0.5,
+        max_concurrent=8,
+        retryable_errors=RETRYABLE_ERRORS,
+        retryable_status_codes=RETRYABLE_STATUS_CODES,
+        sleep=time.sleep,
+        random_function=random.random,
+    ):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.retryable_errors = retryable_errors
+        self.retryable_status_codes = retryable_status_codes
+        self.sleep = sleep
+        self.random_function = random_function
+        self.semaphore = threading.BoundedSemaphore(max_concurrent)
+        self.stats_lock = threading.Lock()
+        self.stats = {"calls": 0, "retries": 0, "failures": 0, "errors": {}}
+
+    def is_retryable(self, error, skip_errors=()):
+        """Check if an error is worth retrying, the skip_errors messages never are."""
+        message = str(error)
+        if any(skipped in message for skipped in skip_errors):
+            return False
+        if get_status_code(error) in self.retryable_status_codes:
+            return True
+        return any(retryable in message for retryable in self.retryable_errors)
+
+    def classify_error(self, error, skip_errors=()):
+        """Return the class of an error: "retryable", "splittable" or "fatal"."""
+        if self.is_retryable(error, skip_errors):
+            return "retryable"
+        if is_splittable_error(error):
+            return "splittable"
+        return "fatal"
+
+    def get_delay(self, attempt, base_delay=None):
+        """Return the delay in seconds before the retry following an attempt (from 1)."""
+        base_delay = self.base_delay if base_delay is None else base_delay
+        delay = min(self.max_delay, base_delay * 2 ** (attempt - 1))
+        return delay * (1 - self.jitter + 2 * self.jitter * self.random_function())
+
+    def count(self, key, error=None, skip_errors=()):
+        """Increase a counter of stats, and the counter of the error class if any."""
+        error_class = None if error is None else self.classify_error(error, skip_errors)
+        with self.stats_lock:
+            self.stats[key] += 1
+            if error_class is not None:
+                errors = self.stats["errors"]
+                errors[error_class] = errors.get(error_class, 0) + 1
+
+    def call(self, function, max_retries=None, base_delay=None, skip_errors=()):
+        """
+        Call a function, retrying it on the retryable errors.
+
+        Args:
+            function (callable): Function called without arguments.
+            max_retries (int): Maximum number of attempts, the policy default if None.
+            base_delay (float): Delay before the first retry, the policy default if None.
+            skip_errors (tuple): Messages of errors raised at once even if retryable,
+                e.g. the errors handled by the caller.
+
+        Returns:
+            The result of the function.
+
+        Raises:
+            Exception: The error of the last attempt, or the first non retryable error.
+        """
+        max_retries = self.max_retries if max_retries is None else max_retries
+        self.count("calls")
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                with self.semaphore:
+                    return function()
+            except Exception as e:
+                if not self.is_retryable(e, skip_errors) or attempt >= max_retries:
+                    self.count("failures", e, skip_errors)
+                    if attempt > 1:
+                        print(f"All {attempt} attempts failed: {e}")
+                    raise
+                delay = self.get_delay(attempt, base_delay)
+                self.count("retries", e, skip_errors)
+                print(
+                    f"Attempt {attempt} failed ({e}). Retrying in {delay:.1f} seconds..."
+                )
+                self.sleep(delay)
+
+    def evaluate(self, ee_object, max_retries=None, base_delay=None, skip_errors=()):
+        """Evaluate an EE object with getInfo, see call."""
+        return self.call(ee_object.getInfo, max_retries, base_delay, skip_errors)
+
+    def get_stats(self):
+        """Return a copy of the counters."""
+        with self.stats_lock:
+            return {**self.stats, "errors": dict(self.stats["errors"])}
+
+
+# Policy shared by all the EE requests of the module
+DEFAULT_RETRY_POLICY = RetryPolicy()
+
+
+def get_ee_key(ee_object):
+    """Return the sha256 of the serialized graph of an EE object."""
+    return hashlib.sha256(ee_object.serialize().encode("utf-8")).hexdigest()
+
+
+def get_argument_key(value):
+    """Return a hashable key of a function argument, EE objects are keyed by their graph."""
+    if hasattr(value, "serialize"):
+        return ("ee", get_ee_key(value))
+    return value
+
+
+def memoize_ee(maxsize=128):
+    """
+    Memoize a pure function building EE graphs, keyed by its arguments.
+
+    The EE objects among the arguments (e.g. the aoi) are keyed by the hash of their
+    serialized graph so equal geometries built separately share the same result.
+    The least recently used results are dropped past maxsize.
+
+    Args:
+        maxsize (int): Maximum number of memoized results.
+
+    Returns:
+        callable: The decorator.
+    """
+
+    def decorator(function):
+        memo = OrderedDict()
+        lock = threading.Lock()
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            key = tuple(get_argument_key(arg) for arg in args) + tuple(
+                (name, get_argument_key(arg)) for name, arg in sorted(kwargs.items())
+            )
+            with lock:
+                if key in memo:
+                    memo.move_to_end(key)
+                    return memo[key]
+
+            result = function(*args, **kwargs)
+            with lock:
+                memo[key] = result
+                while len(memo) > maxsize:
+                    memo.popitem(last=False)
+            return result
+
+        wrapper.cache_clear = memo.clear
+        return wrapper
+
+    return decorator
+
+
+class SingleFlight:
+    """
+    Share the in-flight evaluations of identical EE objects between threads.
+
+    The first caller of a key runs the request, the callers arriving with the same
+    key before it ends wait for it and get a copy of its result, or its error. The
+    key is dropped once the request ends so later calls run a new request.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.shared = 0
+
+    def do(self, key, function):
+        """
+        Call function, or wait for the running call of the same key.
+
+        Args:
+            key (str): Key of the request, e.g. get_ee_key of the EE object.
+            function (callable): Function called without arguments.
+
+        Returns:
+            The result of the function.
+        """
+        with self.lock:
+            future = self.calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self.calls[key] = future
+            else:
+                self.shared += 1
+
+        if not leader:
+            return copy.deepcopy(future.result())
+
+        try:
+            result = function()
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self.lock:
+                del self.calls[key]
+
+
+# In-flight requests shared by all the threads of the module
+SINGLE_FLIGHT = SingleFlight()
+
+
+def evaluate_with_retry(
+    ee_object, max_retries=5, delay=None, policy=None, skip_errors=()
+):
+    """
+    Evaluates a Google Earth Engine object and retries on the retryable EE errors.
+
+    Concurrent evaluations of the same graph share a single request.
+
+    Args:
+        ee_object: The Earth Engine object to evaluate (e.g., a FeatureCollection or Image).
+        max_retries: Maximum number of attempts.
+        delay: Delay (in seconds) before the first retry, the policy default if None.
+        policy: The RetryPolicy, DEFAULT_RETRY_POLICY if None.
+        skip_errors: Messages of errors raised at once even if retryable.
+
+    Returns:
+        The result of the computation as a JSON object.
+
+    Raises:
+        Exception: If all retries fail, the exception from the last attempt is raised.
+    """
+    policy = DEFAULT_RETRY_POLICY if policy is None else policy
+    return SINGLE_FLIGHT.do(
+        get_ee_key(ee_object),
+        lambda: policy.evaluate(ee_object, max_retries, delay, skip_errors),
+    )
+
+
+# Time to live of the cached results in seconds, None never expires
+CACHE_TTLS = {
+    # last date of the alert collections, updated every few days
+    "latest_date": 6 * 3600,
+    # catalogs of images over date ranges that can still receive new images
+    "recent_catalog": 24 * 3600,
+    # catalogs of images over date ranges in the past
+    "historical_catalog": 90 * 24 * 3600,
+    # administrative boundaries
+    "admin": None,
+}
+
+
+def get_catalog_ttl(end_date, recent_days=60):
+    """Return the catalog TTL of a YYYY-MM-DD end date, short if it is recent."""
+    end = datetime.strptime(str(end_date)[:10], "%Y-%m-%d")
+    if end >= datetime.now() - timedelta(days=recent_days):
+        return CACHE_TTLS["recent_catalog"]
+    return CACHE_TTLS["historical_catalog"]
+
+
+class GetInfoCache:
+    """
+    Disk cache of getInfo results, keyed by the hash of the serialized EE object.
+
+    Each result is a JSON file named after the sha256 of ee_object.serialize(), so the
+    same graph gives the same file across sessions. Results older than their TTL are
+    computed again and the least recently used files are deleted once the cache is
+    bigger than max_size. The cache can be disabled with the enabled attribute or the
+    DEFORESTATION_ALERTS_NO_CACHE environment variable.
+
+    Args:
+        folder (Path): Folder of the cache files.
+        max_size (int): Maximum size of the cache in bytes.
+        enabled (bool): Use the cache, if False every call is evaluated.
+    """
+
+    def __init__(self, folder, max_size=100 * 1024**2, enabled=True):
+        self.folder = folder
+        self.max_size = max_size
+        self.enabled = enabled and not os.environ.get("DEFORESTATION_ALERTS_NO_CACHE")
+        self.lock = threading.Lock()
+
+    def get(self, key, ttl=None):
+        """Return (True, value) if key is cached and younger than ttl, else (False, None)."""
+        path = self.folder / f"{key}.json"
+        try:
+            with open(path) as file:
+                cached = json.load(file)
+        except (OSError, ValueError):
+            return False, None
+        if ttl is not None and time.time() - cached["created"] > ttl:
+            return False, None
+        # the modification time is used as last access time for the LRU eviction,
+        # the file may have been evicted by another thread since it was read
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return True, cached["value"]
+
+    def set(self, key, value):
+        """Store a value and evict the least recently used files if needed."""
+        self.folder.mkdir(parents=True, exist_ok=True)
+        path = self.folder / f"{key}.json"
+        temporary_path = self.folder / f"{key}.{threading.get_ident()}.tmp"
+        with open(temporary_path, "w") as file:
+            json.dump({"created": time.time(), "value": value}, file)
+        os.replace(temporary_path, path)
+        self.evict()
+
+    def evict(self):
+        """Delete the least recently used files until the cache fits in max_size."""
+        with self.lock:
+            files = []
+            for path in self.folder.glob("*.json"):
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+            total_size = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files, key=lambda item: item[0]):
+                if total_size <= self.max_size:
+                    break
+                path.unlink(missing_ok=True)
+                total_size -= size
+
+    def evaluate(self, ee_object, ttl=None, max_retries=5):
+        """
+        Evaluate an EE object, reading the result from the cache when possible.
+
+        Args:
+            ee_object: The Earth Engine object to evaluate.
+            ttl (float): Maximum age of a cached result in seconds, None for no limit.
+            max_retries (int): Maximum number of attempts, see evaluate_with_retry.
+
+        Returns:
+            The result of the computation as a JSON object.
+        """
+        if not self.enabled:
+            return evaluate_with_retry(ee_object, max_retries)
+        key = get_ee_key(ee_object)
+        found, value = self.get(key, ttl)
+        if found:
+            return value
+
+        def evaluate_and_store():
+            value = DEFAULT_RETRY_POLICY.evaluate(ee_object, max_retries)
+            self.set(key, value)
+            return value
+
+        return SINGLE_FLIGHT.do(key, evaluate_and_store)
+
+
+# Cache shared by all the EE requests of the module
+GETINFO_CACHE = GetInfoCache(directory.module_dir / "cache")
+
+
+def evaluate_cached(ee_object, ttl=None, max_retries=5):
+    """
+    Evaluates a Google Earth Engine object through the getInfo disk cache.
+
+    Args:
+        ee_object: The Earth Engine object to evaluate.
+        ttl: Maximum age of a cached result in seconds (see CACHE_TTLS), None for no limit.
+        max_retries: Maximum number of attempts.
+
+    Returns:
+        The result of the computation as a JSON object.
+    """
+    return GETINFO_CACHE.evaluate(ee_object, ttl, max_retries)
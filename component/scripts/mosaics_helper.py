@@ -1,18 +1,20 @@
-import pandas as pd
 import geopandas as gpd
 import ee
-import geemap
 import os
-import pathlib
 import zipfile
-import ast
 import numpy as np
 
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
+from functools import lru_cache
 from operator import itemgetter
-from ipyleaflet import GeoData
 from shapely.geometry import shape
+from component.scripts.ee_helper import (
+    CACHE_TTLS,
+    evaluate_cached,
+    evaluate_with_retry,
+    get_catalog_ttl,
+)
 
 
 def convert_julian_to_date(julian_date):
@@ -189,8 +191,6 @@ def scaleS2v2(image):
 
 def download_both_images(image1, image2, image_name, source1, source2, region):
     from geemap import download_ee_image
-    import ee
-    import os
 
     if source1 in ["Sentinel 2", "Landsat"]:
         rimage1 = scaleS2v2(image1)
@@ -220,13 +220,9 @@ def download_both_images(image1, image2, image_name, source1, source2, region):
 def raster_to_gdf(raster_path, output_epsg, threshold):
     import rasterio
     import geopandas as gpd
-    from shapely.geometry import shape, box
+    from shapely.geometry import box
     from rasterio.features import shapes
-    from rasterio.warp import calculate_default_transform, reproject, Resampling
-    from fiona.crs import from_epsg
     from shapely.geometry import Point
-    import json
-    from ipyleaflet import GeoData
     import numpy as np
 
     # Open the raster file
@@ -294,7 +290,6 @@ def raster_to_gdf(raster_path, output_epsg, threshold):
 #Funcion para verificar si el modelo de DL encontro poligonos de deforestacion
 def verify_raster(raster_path, threshold):
     import rasterio
-    import numpy as np
     from rasterio.features import shapes
 
     with rasterio.open(raster_path) as src:
@@ -429,7 +424,6 @@ def convertir_formato3(input_features, color="#2196F3"):
 def save_prediction(original_img, prediction, threshold, output_path):
 
     import rasterio
-    import numpy as np
 
     """
     Save prediction as geotiff .
@@ -463,7 +457,6 @@ def save_prediction(original_img, prediction, threshold, output_path):
 def save_prediction_prob(original_img, prediction, output_path):
 
     import rasterio
-    import numpy as np
 
     """
     Save prediction as geotiff .
@@ -495,11 +488,9 @@ def save_prediction_prob(original_img, prediction, output_path):
 
 
 def apply_dl_model(image, model):
-    import os
     import rasterio
     import numpy as np
     import tensorflow as tf
-    from matplotlib import pyplot as plt
 
     from tensorflow.keras import layers, models
     from tensorflow.keras import backend as K
@@ -589,7 +580,6 @@ def simplify_and_extract_features(
     Returns:
     list: Simplified GeoJSON features.
     """
-    import geopandas as gpd
 
     # Ensure the column exists
     if column not in gdf.columns:
@@ -611,7 +601,6 @@ def simplify_and_extract_features(
 
 
 def add_files_to_zip(zip_filename, file1, file2):
-    import zipfile
 
     # Open a zip file in write mode, create it if it doesn't exist
     with zipfile.ZipFile(zip_filename, "w") as zipf:
@@ -641,6 +630,13 @@ def is_after_march_2025(target_date_str):
 
 
 def check_planet_collection_access():
+    """Return the NICFI access status of each region, checked once per session."""
+    # Copy so the callers can't modify the cached statuses
+    return dict(get_planet_collection_access())
+
+
+@lru_cache(maxsize=1)
+def get_planet_collection_access():
     # Initialize the GEE account
     # Define the collection names and their corresponding regions
     collections = {
@@ -659,7 +655,7 @@ def check_planet_collection_access():
             img_collection = ee.ImageCollection(collection)
 
             # Get the size of the collection
-            size = img_collection.size().getInfo()
+            size = evaluate_with_retry(img_collection.size())
 
             # Check if the size is greater than 0 and update the access status dictionary accordingly
             if size > 0:
@@ -673,8 +669,8 @@ def check_planet_collection_access():
             else:
                 raise  # Re-raise other EEException errors
 
-    # Return the dictionary containing the access status for each region
-    return access_status
+    # Return the access status for each region, as a tuple to be cached
+    return tuple(access_status.items())
 
 
 def check_access(dictionary):
@@ -813,7 +809,7 @@ def getPlanetMonthly(geometry, date1, date2):
                             f"{region} collection not found or user does not have access."
                         )
 
-        if intersecting_images.size().getInfo() == 0:
+        if evaluate_cached(intersecting_images.size(), get_catalog_ttl(date2)) == 0:
             return no_images
 
         else:
@@ -824,9 +820,10 @@ def getPlanetMonthly(geometry, date1, date2):
             ).filterBounds(geometry)
 
             # Retrieve all image IDs with a single getInfo call
-            image_ids = planet_filtered_collection.aggregate_array(
-                "system:id"
-            ).getInfo()
+            image_ids = evaluate_cached(
+                planet_filtered_collection.aggregate_array("system:id"),
+                get_catalog_ttl(date2),
+            )
             elements = []
 
             if len(image_ids) > 0:
@@ -853,7 +850,10 @@ def getPlanetMonthly(geometry, date1, date2):
 
                     # t1 = ee.Number(planet_clip.get('system:time_start')).getInfo()
                     t2 = ee.Number(planet_clip.get("system:time_end"))
-                    t3 = ee.Date(t2).advance(-1, "days").millis().getInfo()
+                    t3 = evaluate_cached(
+                        ee.Date(t2).advance(-1, "days").millis(),
+                        CACHE_TTLS["historical_catalog"],
+                    )
 
                     dictionary = {
                         "value": name,
@@ -869,7 +869,10 @@ def getPlanetMonthly(geometry, date1, date2):
             ):
 
                 last_two_imgs = selected_planet.sort("system:time_end", False).limit(2)
-                image_ids_2 = last_two_imgs.aggregate_array("system:id").getInfo()
+                image_ids_2 = evaluate_cached(
+                    last_two_imgs.aggregate_array("system:id"),
+                    CACHE_TTLS["recent_catalog"],
+                )
                 # Process each image ID to format the name
                 for image_id in image_ids_2:
                     # Split the image ID into parts
@@ -893,7 +896,10 @@ def getPlanetMonthly(geometry, date1, date2):
 
                     # t1 = ee.Number(planet_clip.get('system:time_start')).getInfo()
                     t2 = ee.Number(planet_clip.get("system:time_end"))
-                    t3 = ee.Date(t2).advance(-1, "days").millis().getInfo()
+                    t3 = evaluate_cached(
+                        ee.Date(t2).advance(-1, "days").millis(),
+                        CACHE_TTLS["historical_catalog"],
+                    )
 
                     dictionary = {
                         "value": name,
@@ -915,35 +921,35 @@ def getIndividualS2(geometry, date1, date2):
         .filter(ee.Filter.lt("CLOUDY_PIXEL_PERCENTAGE", 90))
     )
 
-    # Retrieve all unique Generation time values
-    s2_dates_list = s2_filtered.aggregate_array("GENERATION_TIME").distinct().getInfo()
+    # Retrieve the mean cloud cover and number of tiles of each Generation time
+    # in a single grouped reduction
+    reducer = (
+        ee.Reducer.mean()
+        .combine(ee.Reducer.count(), sharedInputs=True)
+        .group(groupField=1, groupName="GENERATION_TIME")
+    )
+    groups = evaluate_cached(
+        s2_filtered.reduceColumns(
+            reducer, ["CLOUDY_PIXEL_PERCENTAGE", "GENERATION_TIME"]
+        ).get("groups"),
+        get_catalog_ttl(date2),
+    )
     elements = []
 
-    if len(s2_dates_list) > 0:
-        # Process each unique Generation time to get the mosaic
-
-        for s2_date in s2_dates_list:
-            # Create image to display
-            s2_same_date = s2_filtered.filter(ee.Filter.eq("GENERATION_TIME", s2_date))
-            # s2_same_date_clip = s2_same_date.mosaic().clip(geometry)
-
-            # Calculate properties of images
-            mean_cloud = (
-                s2_same_date.aggregate_mean("CLOUDY_PIXEL_PERCENTAGE")
-                .format("%.2f")
-                .getInfo()
-            )
-            date = datetime.fromtimestamp(s2_date / 1000).strftime("%Y-%m-%d")
-            name = f"Sentinel 2 {date} "
-
-            dictionary = {
-                "value": name,
-                "image_id": s2_date,
-                "milis": s2_date,
-                "source": "Sentinel 2",
-                "cloud_cover": mean_cloud,
-            }
-            elements.append(dictionary)
+    for group in sorted(groups, key=itemgetter("GENERATION_TIME")):
+        s2_date = int(group["GENERATION_TIME"])
+        date = datetime.fromtimestamp(s2_date / 1000).strftime("%Y-%m-%d")
+        name = f"Sentinel 2 {date} "
+
+        dictionary = {
+            "value": name,
+            "image_id": s2_date,
+            "milis": s2_date,
+            "source": "Sentinel 2",
+            "cloud_cover": f"{group['mean']:.2f}",
+            "tile_count": group["count"],
+        }
+        elements.append(dictionary)
 
     return elements
 
@@ -958,39 +964,34 @@ def getIndividualLandsat(geometry, date1, date2):
         .filter(ee.Filter.lt("CLOUD_COVER", 90))
     )
 
-    # Retrieve all unique Generation time values
-    landsat_dates_list = (
-        landsat_filtered.aggregate_array("DATE_PRODUCT_GENERATED").distinct().getInfo()
+    # Retrieve the date, cloud cover and scene id of the first scene of each
+    # Generation time in a single request
+    scenes = evaluate_cached(
+        landsat_filtered.distinct("DATE_PRODUCT_GENERATED")
+        .reduceColumns(
+            ee.Reducer.toList(3),
+            ["DATE_PRODUCT_GENERATED", "CLOUD_COVER", "LANDSAT_SCENE_ID"],
+        )
+        .get("list"),
+        get_catalog_ttl(date2),
     )
     elements = []
 
-    if len(landsat_dates_list) > 0:
-        # Process each unique Generation time to get the mosaic
-
-        for landsat_date in landsat_dates_list:
-            # Create image to display
-            landsat_img = landsat_filtered.filter(
-                ee.Filter.eq("DATE_PRODUCT_GENERATED", landsat_date)
-            ).first()
-
-            # Calculate properties of images
-            cloud_cover = (
-                ee.Number(landsat_img.get("CLOUD_COVER")).format("%.2f").getInfo()
-            )
-            scene_id = landsat_img.get("LANDSAT_SCENE_ID")
+    if len(scenes) > 0:
+        for landsat_date, cloud_cover, scene_id in sorted(scenes):
             date = datetime.fromtimestamp(landsat_date / 1000).strftime("%Y-%m-%d")
             name = f"Landsat {date} "
 
             dictionary = {
                 "value": name,
                 "image_id": scene_id,
-                "milis": ee.Number(landsat_date).getInfo(),
+                "milis": landsat_date,
                 "source": "Landsat",
-                "cloud_cover": cloud_cover,
+                "cloud_cover": f"{cloud_cover:.2f}",
             }
             elements.append(dictionary)
 
-    elif len(landsat_dates_list) == 0:
+    else:
         # Define the no-access result dictionary
         elements = [
             {
@@ -1006,7 +1007,6 @@ def getIndividualLandsat(geometry, date1, date2):
 
 
 def geojson_to_geodataframe(geojson):
-    from shapely.geometry import shape
 
     """
     Convert a GeoJSON-like dictionary to a GeoDataFrame.
@@ -1047,7 +1047,7 @@ def multipolygon_to_geodataframe(geometry):
     Raises:
         ValueError: If the input is not a MultiPolygon or Polygon.
     """
-    from shapely.geometry import shape, MultiPolygon, Polygon
+    from shapely.geometry import MultiPolygon, Polygon
 
     if isinstance(geometry, MultiPolygon):
         # Extract individual polygons from the MultiPolygon
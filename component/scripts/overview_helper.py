@@ -1,7 +1,6 @@
 from ipyleaflet import (
     Marker,
     AwesomeIcon,
-    Map,
     Popup,
     MarkerCluster,
     WidgetControl,
@@ -9,10 +8,8 @@ from ipyleaflet import (
     GeoData,
 )
 import ipywidgets as widgets
-from ipywidgets import HTML, HBox, VBox, Label, Button, Layout
-from shapely.geometry import Point, Polygon
-import pandas as pd
-import geopandas as gpd
+from ipywidgets import HTML, VBox, Label, Button, Layout
+from shapely.geometry import Point
 from datetime import datetime, timedelta
 from ipyevents import Event
 
@@ -486,3 +483,29 @@ def create_table_rows(data, labels):
         )
         for label, value in zip(labels, data)
     ]
+
+
+def add_hotspot_layer(leaflet_map, hotspots, name, max_area_ha=100):
+    """
+    Add the alert hotspot cells to the map as a heat layer of the alert area.
+
+    Args:
+        leaflet_map (SepalMap): The map.
+        hotspots (list): GeoJSON features returned by get_alert_hotspots.
+        name (str): Name of the layer.
+        max_area_ha (float): Alert area of a cell shown with the hottest color.
+    """
+    palette = ["#ffffb2", "#fecc5c", "#fd8d3c", "#f03b20", "#bd0026"]
+
+    def style_cell(feature):
+        ratio = min(feature["properties"]["area_ha"] / max_area_ha, 1)
+        color = palette[min(int(ratio * len(palette)), len(palette) - 1)]
+        return {"fillColor": color, "color": color}
+
+    heat_layer = ipyleaflet.GeoJSON(
+        data={"type": "FeatureCollection", "features": hotspots},
+        name=name,
+        style={"weight": 0, "fillOpacity": 0.6},
+        style_callback=style_cell,
+    )
+    leaflet_map.add_layer(heat_layer)
@@ -13,6 +13,7 @@ import threading
 from shapely import wkt
 from component.parameter import directory
 from component.scripts.alert_filter_helper import check_alert_filter_inputs
+from component.scripts.report_builder import encode_alert_sources
 
 
 def generate_recipe_string():
@@ -230,6 +231,11 @@ def load_gdf_from_csv(csv_file, geometry_columns_list):
             lambda x: wkt.loads(x) if pd.notnull(x) and x != "" else None
         )
 
+    # encode the alert sources of recipes saved before the alert source bitmask
+    if "alert_source_mask" not in df and "alert_type_unique" in df:
+        df["alert_source_mask"] = encode_alert_sources(df["alert_type_unique"])
+    df = df.drop(columns=["alert_type_unique", "alert_sources"], errors="ignore")
+
     # finally reconstruct geodataframe
     gdf = gpd.GeoDataFrame(df)
     return gdf
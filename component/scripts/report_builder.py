@@ -343,3 +343,89 @@ def get_unique_alerts(alert_list):
 
     return list(unique_alerts)
 
+
+# Bit of each alert source in the alert_source_mask column
+ALERT_SOURCE_BITS = {"GLAD-L": 1, "RADD": 2, "GLAD-S2": 4, "CCDC": 8}
+
+# Digit used by each alert source in the alert band (see get_unique_alerts)
+ALERT_SOURCE_DIGITS = {"GLAD-L": 1, "RADD": 10, "GLAD-S2": 100, "CCDC": 1000}
+
+
+def alert_values_to_mask(alert_values):
+    """
+    Convert alert band values to alert source bitmasks.
+
+    Args:
+        alert_values (array-like): Integers built by summing the alert source digits.
+
+    Returns:
+        np.ndarray: The bitmask of the sources triggered in each value.
+    """
+    values = np.asarray(alert_values, dtype=np.int64)
+    masks = np.zeros(values.shape, dtype=np.int64)
+    for name, digit in ALERT_SOURCE_DIGITS.items():
+        source_digit = (values // digit) % 10
+        triggered = (source_digit == 1) | (source_digit == 2)
+        masks |= np.where(triggered, ALERT_SOURCE_BITS[name], 0)
+    return masks
+
+
+def encode_alert_sources(alert_type_lists):
+    """
+    Compute the alert source bitmask of each alert from its list of alert types.
+
+    Args:
+        alert_type_lists (iterable): One list of alert band values per alert, lists
+            saved as strings in older alert_db.csv files are accepted.
+
+    Returns:
+        np.ndarray: One bitmask per alert.
+    """
+    alert_type_lists = list(alert_type_lists)
+    rows, values = [], []
+    for row, alert_list in enumerate(alert_type_lists):
+        if isinstance(alert_list, str):
+            try:
+                alert_list = ast.literal_eval(alert_list)
+            except (ValueError, SyntaxError):
+                alert_list = []
+        if not isinstance(alert_list, (list, tuple)):
+            # a single value, anything else (None, nan) has no alert source
+            alert_list = [alert_list] if isinstance(alert_list, (int, np.integer)) else []
+        rows += [row] * len(alert_list)
+        values += alert_list
+
+    masks = np.zeros(len(alert_type_lists), dtype=np.int64)
+    np.bitwise_or.at(masks, np.asarray(rows, dtype=np.int64), alert_values_to_mask(values))
+    return masks
+
+
+def decode_alert_sources(masks):
+    """
+    Decode alert source bitmasks to lists of alert source names.
+
+    Args:
+        masks (array-like): Alert source bitmasks.
+
+    Returns:
+        list: The list of alert source names of each mask.
+    """
+    masks = np.asarray(masks, dtype=np.int64)
+    unique_masks, inverse = np.unique(masks, return_inverse=True)
+    bits = np.array(list(ALERT_SOURCE_BITS.values()))
+    names = np.array(list(ALERT_SOURCE_BITS.keys()))
+    triggered = (unique_masks[:, None] & bits) > 0
+    unique_names = [names[row].tolist() for row in triggered]
+    return [unique_names[i] for i in inverse.ravel()]
+
+
+def format_alert_sources(mask):
+    """
+    Render an alert source bitmask as a human readable string.
+
+    The sources are always listed in the ALERT_SOURCE_BITS order (GLAD-L, RADD,
+    GLAD-S2, CCDC). get_unique_alerts lists them in set order, which changes between
+    sessions, so "RADD and GLAD-L" can now read "GLAD-L and RADD".
+    """
+    return format_list(decode_alert_sources([mask])[0])
+
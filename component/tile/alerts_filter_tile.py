@@ -1,11 +1,8 @@
 from sepal_ui import sepalwidgets as sw
-from sepal_ui import aoi
 from sepal_ui import color
 from sepal_ui.mapping import SepalMap
 from sepal_ui.mapping.draw_control import DrawControl
-from sepal_ui.mapping.layers_control import LayersControl
 from sepal_ui.mapping.inspector_control import InspectorControl
-from sepal_ui.mapping.map_btn import MapBtn
 from sepal_ui.scripts import utils as su
 import ipyvuetify as v
 from IPython.display import display, HTML
@@ -19,14 +16,11 @@ from component.scripts.recipe_helper import (
     save_model_parameters_to_json,
 )
 
-from component.widget.custom_sw import CustomDrawControl, CustomBtnWithLoader
+from component.widget.custom_sw import CustomBtnWithLoader
 
 import math
 import ee
-import time
 import threading
-import logging
-from shapely.geometry import Point, Polygon
 
 
 su.init_ee()
@@ -213,8 +207,32 @@ class AlertsFilterTile(sw.Layout):
             clearable=True,
             chips=True,
         )
+        # Stratified random sample of the alerts instead of the first ones, a sample
+        # needs a max number of alerts so the switch is disabled with "All"
+        self.stratified_sample_switch = v.Switch(
+            label=cm.filter_tile.stratified_sample_label,
+            hint=cm.filter_tile.stratified_sample_hint,
+            persistent_hint=True,
+            v_model=False,
+            disabled=True,
+        )
+
+        def sample_option(change):
+            try:
+                max_number = check_integer(change["new"], "")
+            except Exception:
+                max_number = 0
+            self.stratified_sample_switch.disabled = max_number <= 0
+            if max_number <= 0:
+                self.stratified_sample_switch.v_model = False
+
+        self.number_of_alerts.observe(sample_option, "v_model")
         self.card04 = SepalCard(
-            children=[max_number_title, self.number_of_alerts],
+            children=[
+                max_number_title,
+                self.number_of_alerts,
+                self.stratified_sample_switch,
+            ],
         )
 
         # Define analyze button function
@@ -348,16 +366,38 @@ class AlertsFilterTile(sw.Layout):
 
     ## Processing functions
 
-    def assign_bb_partial(self, json_file):
+    def assign_bb_partial(self, json_file, generation):
+        # Drop the alerts of an extraction replaced in the meantime
+        if generation != self.selected_alerts_model.extraction_generation:
+            return
         self.selected_alerts_model.alerts_bbs = json_file
         self.selected_alerts_model.received_alerts = "Yes"
         #print(self.selected_alerts_model.received_alerts)
 
-    def assign_bb_full(self, json_file):
+    def assign_bb_page(self, json_file, generation):
+        # Drop the pages of an extraction replaced in the meantime
+        if generation != self.selected_alerts_model.extraction_generation:
+            return
+        self.selected_alerts_model.alerts_page_bbs = json_file
+
+    def assign_bb_full(self, json_file, generation):
+        # Drop the alerts of an extraction replaced in the meantime
+        if generation != self.selected_alerts_model.extraction_generation:
+            print("Dropping the alerts of a replaced extraction")
+            return
         self.selected_alerts_model.alerts_total_bbs = json_file
         self.selected_alerts_model.received_alerts = "Yes"
         #print(self.selected_alerts_model.received_alerts)
 
+    def assign_hotspots(self, poly, alerta_reducir, pixel_size, generation):
+        try:
+            hotspots = get_alert_hotspots(poly, alerta_reducir, pixel_size)
+        except Exception as e:
+            print(f"Alert hotspots not available: {e}")
+            return
+        if generation == self.selected_alerts_model.extraction_generation:
+            self.selected_alerts_model.alert_hotspots = hotspots
+
     def start_thread_full(
         self,
         poly,
@@ -367,10 +407,25 @@ class AlertsFilterTile(sw.Layout):
         min_size_pixels,
         max_number_alerts,
         sorting,
+        stratified_sample=False,
     ):
-        thread = threading.Thread(
-            target=lambda: self.assign_bb_full(
-                obtener_datos_gee_total_v3(
+        generation = self.selected_alerts_model.extraction_generation
+
+        def extract_alerts():
+            if stratified_sample and max_number_alerts > 0:
+                # Sample max_number_alerts alerts over the strata, see sample_bounding_boxes
+                return obtener_datos_gee_sample(
+                    poly,
+                    alerta_reducir,
+                    custom_reducer,
+                    pixel_size,
+                    min_size_pixels,
+                    max_number_alerts,
+                    sorting,
+                )
+            if max_number_alerts <= 0:
+                # All alerts were requested, the first ones come from the partial thread
+                return obtener_datos_gee_paginated(
                     poly,
                     alerta_reducir,
                     custom_reducer,
@@ -378,7 +433,32 @@ class AlertsFilterTile(sw.Layout):
                     min_size_pixels,
                     max_number_alerts,
                     sorting,
+                    on_page=lambda page: self.assign_bb_page(page, generation),
+                    start_date=self.aoi_date_model.start_date,
+                    end_date=self.aoi_date_model.end_date,
                 )
+            return obtener_datos_gee_total_v3(
+                poly,
+                alerta_reducir,
+                custom_reducer,
+                pixel_size,
+                min_size_pixels,
+                max_number_alerts,
+                sorting,
+                start_date=self.aoi_date_model.start_date,
+                end_date=self.aoi_date_model.end_date,
+            )
+
+        thread = threading.Thread(
+            target=lambda: self.assign_bb_full(extract_alerts(), generation)
+        )
+        thread.start()
+
+    def start_thread_hotspots(self, poly, alerta_reducir, pixel_size):
+        generation = self.selected_alerts_model.extraction_generation
+        thread = threading.Thread(
+            target=lambda: self.assign_hotspots(
+                poly, alerta_reducir, pixel_size, generation
             )
         )
         thread.start()
@@ -394,6 +474,7 @@ class AlertsFilterTile(sw.Layout):
         sorting,
         grid_size,
     ):
+        generation = self.selected_alerts_model.extraction_generation
         thread2 = threading.Thread(
             target=lambda: self.assign_bb_partial(
                 obtener_datos_gee_parcial_map(
@@ -405,7 +486,8 @@ class AlertsFilterTile(sw.Layout):
                     max_number_alerts,
                     sorting,
                     grid_size,
-                )
+                ),
+                generation,
             )
         )
         thread2.start()
@@ -467,7 +549,7 @@ class AlertsFilterTile(sw.Layout):
 
         # Generar 3 bandas para las alertas de todo el area
         i = clip_alert.select("alert").gt(0).rename("mask_alert")
-        a = clip_alert.select("alert")
+        a = create_alert_source_band(clip_alert.select("alert"))
         d = clip_alert.select("date")
         # alertarea = i.multiply(ee.Image.pixelArea()).rename('area');
 
@@ -608,11 +690,7 @@ class AlertsFilterTile(sw.Layout):
         # Create vector download required variables
 
         # Crear reducer a aplicar sobre las alertas
-        custom_reducer = (
-            ee.Reducer.count()
-            .combine(ee.Reducer.toList().unweighted(), "alert_type_")
-            .combine(ee.Reducer.minMax().unweighted(), "alert_date_")
-        )
+        custom_reducer = create_alert_reducer()
         max_number_alerts = int(user_max_number_alerts)
 
         (
@@ -630,6 +708,21 @@ class AlertsFilterTile(sw.Layout):
             alert_area_selection,
         )
 
+        # Keep the extraction parameters and the alert hotspots for the overview
+        self.selected_alerts_model.extraction_params = {
+            "aoi": poly,
+            "alert_raster": alerta_reducir,
+            "ee_reducer": custom_reducer,
+            "pixel_size": pixel_size,
+            "min_alert_size_pixels": min_size_pixels,
+            "max_elementos": max_number_alerts,
+            "sorting": alert_sorting_method,
+        }
+        # Results of a previous extraction still running are dropped
+        self.selected_alerts_model.alert_hotspots = None
+        self.selected_alerts_model.extraction_generation += 1
+        self.start_thread_hotspots(poly, alerta_reducir, pixel_size)
+
         # Create partial vector alerts
         self.start_thread_partial(
             poly,
@@ -651,6 +744,7 @@ class AlertsFilterTile(sw.Layout):
             min_size_pixels,
             max_number_alerts,
             alert_sorting_method,
+            self.stratified_sample_switch.v_model,
         )
 
         wait_messages = [
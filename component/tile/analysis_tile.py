@@ -1,41 +1,33 @@
 from sepal_ui import color, sepalwidgets as sw
-from sepal_ui import aoi
 from sepal_ui.mapping import SepalMap
 from sepal_ui.mapping.draw_control import DrawControl
-from sepal_ui.mapping.layers_control import LayersControl
-from sepal_ui.mapping.inspector_control import InspectorControl
 from sepal_ui.mapping.aoi_control import AoiControl
 from sepal_ui.scripts import utils as su
-from traitlets import link, observe
+from traitlets import link
 import ipyvuetify as v
 from IPython.display import display, HTML
 
 
 from component.message import cm
 from component.scripts.alert_filter_helper import convert_to_geopandas
+from component.scripts.ee_helper import CACHE_TTLS, evaluate_cached
 from component.scripts.mosaics_helper import *
 from component.scripts.report_builder import *
 from component.scripts.recipe_helper import update_saved_dictionary
 from component.widget.custom_sw import (
-    CustomDrawControl,
     CustomSlideGroup,
     CustomBtnWithLoader,
     decorator_loading_v2
 )
 
 import os
-import numpy as np
-import rasterio
-import math
 import ee
-from shapely.geometry import Point, Polygon
 import time
 from datetime import datetime
 from operator import itemgetter
 from ipyleaflet import GeoData, GeoJSON
 import threading
 import queue
-import ast
 from pathlib import Path
 
 su.init_ee()
@@ -103,6 +95,7 @@ class AnalysisTile(sw.Layout):
         ## Observe changes in selected_alerts_model and update tile when it changes
         self.selected_alerts_model.observe(self.update_gdf_partial, "alerts_bbs")
         self.selected_alerts_model.observe(self.update_gdf_full, "alerts_total_bbs")
+        self.selected_alerts_model.observe(self.update_gdf_page, "alerts_page_bbs")
         self.analyzed_alerts_model.observe(self.view_actual_alert, "actual_alert_id")
         self.analyzed_alerts_model.observe(
             self.slider_s2_before, "before_s2_images_time"
@@ -901,6 +894,42 @@ class AnalysisTile(sw.Layout):
             )
             self.save_alerts_to_gdf()
 
+    def append_gdf_page(self):
+        """
+        Append the last received page of alerts to the analyzed alerts.
+
+        Only the page is converted, its alerts already in the analyzed alerts are
+        skipped. The complete list still replaces the not reviewed alerts once the
+        extraction is over (see create_gdf_full).
+        """
+        page = self.selected_alerts_model.alerts_page_bbs
+        data = self.analyzed_alerts_model.alerts_gdf
+        if not page:
+            return
+
+        page_gdf = convert_to_geopandas(page)
+        if data is None:
+            combined_gdf = page_gdf
+            self.analyzed_alerts_model.actual_alert_id = 0
+        else:
+            page_gdf = page_gdf[
+                ~page_gdf["bounding_box"].isin(data["bounding_box"].unique())
+            ]
+            combined_gdf = pd.concat([data, page_gdf], ignore_index=True)
+        self.analyzed_alerts_model.alerts_gdf = combined_gdf
+        self.analyzed_alerts_model.max_alert_id = len(combined_gdf)
+        recipe_dictionary_path = (
+            self.app_tile_model.recipe_folder_path + "/recipe_parameters.json"
+        )
+        update_saved_dictionary(
+            recipe_dictionary_path,
+            "max_alert_id",
+            self.analyzed_alerts_model.max_alert_id,
+        )
+
+    def update_gdf_page(self, change):
+        self.append_gdf_page()
+
     def update_gdf_partial(self, change):
         print("cambio detectado en selected_Alerts, ejecutando create gdf")
         self.create_gdf_partial()
@@ -1235,8 +1264,7 @@ class AnalysisTile(sw.Layout):
         # Obtener fechas de la alerta
         fecha1 = convert_julian_to_date(alerta["alert_date_min"])
         fecha2 = convert_julian_to_date(alerta["alert_date_max"])
-        #alert_source = format_list(get_unique_alerts(alerta["alert_type_unique"]))
-        alert_source = alerta["alert_sources"]
+        alert_source = format_alert_sources(alerta["alert_source_mask"])
         
         # Cambio en boton de navegacion
         self.alert_id_button.v_model = self.analyzed_alerts_model.actual_alert_id
@@ -1409,14 +1437,8 @@ class AnalysisTile(sw.Layout):
         import os
 
         os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
-        import rasterio
-        import numpy as np
-        import tensorflow as tf
-        from tensorflow.keras import layers, models
-        from tensorflow.keras import backend as K
-        from MightyMosaic import MightyMosaic
-
-        from component.scripts.model_worker import apply_dl_model, save_prediction_prob
+
+        from component.scripts.model_worker import apply_dl_model
         from huggingface_hub import hf_hub_download
 
         hf_hub_download(
@@ -1451,14 +1473,8 @@ class AnalysisTile(sw.Layout):
         import os
 
         os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
-        import rasterio
-        import numpy as np
-        import tensorflow as tf
-        from tensorflow.keras import layers, models
-        from tensorflow.keras import backend as K
-        from MightyMosaic import MightyMosaic
-
-        from component.scripts.model_worker import apply_dl_model, save_prediction_prob
+
+        from component.scripts.model_worker import apply_dl_model
         from huggingface_hub import hf_hub_download
 
         hf_hub_download(
@@ -1793,10 +1809,6 @@ class AnalysisTile(sw.Layout):
         alertas_gdf.at[actual_alert_id, "after_img_info"] = (
             self.selected_img_after_info_list[1]
         )
-        ##Create dictionary of alert sources
-        # alertas_gdf.at[actual_alert_id, "alert_sources"] = format_list(
-        #     get_unique_alerts(alertas_gdf.loc[actual_alert_id, "alert_type_unique"])
-        # )
 
         # Get adminstrative location attributes
         adminL2 = ee.FeatureCollection("FAO/GAUL/2015/level2")
@@ -1824,10 +1836,10 @@ class AnalysisTile(sw.Layout):
             ee.String(""),
         )
 
-        alertas_gdf.at[actual_alert_id, "admin1"] = st1.getInfo()[:-1]
-        alertas_gdf.at[actual_alert_id, "admin2"] = st2.getInfo()[:-1]
-        alertas_gdf.at[actual_alert_id, "admin3"] = st3.getInfo()[:-1]
-        alertas_gdf.at[actual_alert_id, "admin3"] = st3.getInfo()[:-1]
+        admin_names = evaluate_cached(ee.List([st1, st2, st3]), CACHE_TTLS["admin"])
+        alertas_gdf.at[actual_alert_id, "admin1"] = admin_names[0][:-1]
+        alertas_gdf.at[actual_alert_id, "admin2"] = admin_names[1][:-1]
+        alertas_gdf.at[actual_alert_id, "admin3"] = admin_names[2][:-1]
 
         if self.boton_confirmacion.v_model == cm.analysis_tile.questionarie.confirmation_no and self.analyzed_alerts_model.defo_dl_layer is not None:
             raise Exception(cm.analysis_tile.questionarie.confirmation_q)
@@ -1863,6 +1875,10 @@ class AnalysisTile(sw.Layout):
         ]  # Select the first row as an example
         # Convert it to a GeoDataFrame (since a single row becomes a Series)
         selected_gdf = gpd.GeoDataFrame([selected_element], columns=alertas_gdf.columns)
+        # Render the alert sources for the exported file and the report
+        selected_gdf["alert_sources"] = selected_gdf["alert_source_mask"].map(
+            format_alert_sources
+        )
         # Set the geometry column if necessary (optional, if it is not already set)
         if not selected_gdf['alert_polygon'].isnull().all():
             selected_gdf.set_geometry("alert_polygon", inplace=True)
@@ -1,17 +1,17 @@
 from sepal_ui import sepalwidgets as sw
-from sepal_ui import aoi
 from sepal_ui.mapping import SepalMap
 from component.message import cm
 import ipyvuetify as v
 from IPython.display import display, HTML
-from ipyleaflet import WidgetControl, GeoData, LayersControl as ipyLayersControl
 
 from sepal_ui.scripts.utils import init_ee
-from traitlets import Any, Unicode, link
+from sepal_ui.scripts import utils as su
 from component.scripts.overview_helper import *
-from sepal_ui.mapping.layers_control import LayersControl
-from sepal_ui.mapping.menu_control import MenuControl
-from sepal_ui.mapping.map_btn import MapBtn
+from component.scripts.alert_filter_helper import (
+    get_hotspot_bounds,
+    get_hotspot_cell,
+    obtener_datos_gee_adaptive,
+)
 import ee
 
 init_ee()
@@ -39,6 +39,7 @@ class OverviewTile(sw.Layout):
         ## Observe changes and update tile when it changes
         self.analyzed_alerts_model.observe(self.update_tile, "last_save_time")
         self.analyzed_alerts_model.observe(self.update_tile, "alerts_gdf")
+        self.selected_alerts_model.observe(self.update_tile, "alert_hotspots")
 
         super().__init__()
 
@@ -80,6 +81,7 @@ class OverviewTile(sw.Layout):
         self.map_1 = SepalMap()
         self.map_1.add_class("custom-map-class")
         self.map_1.add_basemap("SATELLITE")
+        self.map_1.on_interaction(self.on_map_click)
         
         # Side information labels
         section_title = v.CardTitle(
@@ -94,6 +96,30 @@ class OverviewTile(sw.Layout):
         gpkg_name = self.app_tile_model.recipe_folder_path + "/alert_db.csv"
         self.dwn_all_btn.set_url(path=gpkg_name)
 
+        # Hotspot drill-in, the map clicks select a hotspot cell only in hotspot mode
+        self.hotspot_cell = None
+        self.hotspot_switch = v.Switch(
+            label=cm.overview_tile.hotspot_mode, v_model=False, class_="ma-1"
+        )
+        self.hotspot_alert = sw.Alert().hide()
+        self.hotspot_confirm_btn = sw.Btn(
+            msg=cm.overview_tile.hotspot_confirm_btn,
+            color="primary",
+            small=True,
+            class_="pa-1 ma-1",
+        ).hide()
+        self.hotspot_cancel_btn = sw.Btn(
+            msg=cm.overview_tile.hotspot_cancel_btn,
+            outlined=True,
+            small=True,
+            class_="pa-1 ma-1",
+        ).hide()
+        self.extract_hotspot_cell = su.loading_button(
+            alert=self.hotspot_alert, button=self.hotspot_confirm_btn
+        )(self.extract_hotspot_cell)
+        self.hotspot_confirm_btn.on_event("click", self.extract_hotspot_cell)
+        self.hotspot_cancel_btn.on_event("click", self.cancel_hotspot_cell)
+
         card01 = v.Card(
             class_="pa-3 ma-3", hover=True, children=[section_title, self.info_table]
         )
@@ -102,6 +128,15 @@ class OverviewTile(sw.Layout):
             hover=True,
             children=[self.dwn_all_btn],  # , self.dwn_summary_btn],
         )
+        card03 = v.Card(
+            class_="pa-3 ma-3",
+            hover=True,
+            children=[
+                self.hotspot_switch,
+                self.hotspot_alert,
+                v.Flex(children=[self.hotspot_confirm_btn, self.hotspot_cancel_btn]),
+            ],
+        )
         # Layout 
         # Two-panel layout using Flex
         left_panel = v.Flex(
@@ -109,7 +144,7 @@ class OverviewTile(sw.Layout):
             style_='flex: 1 1 auto ; overflow: hidden'
         )
         right_panel = v.Flex(
-            children=[card01, card02],
+            children=[card01, card02, card03],
             style_='flex: 0 0 16rem ; overflow: auto'
         )
 
@@ -125,6 +160,12 @@ class OverviewTile(sw.Layout):
         else:
             self.map_1.remove_all()
             self.map_1.add_ee_layer(self.aoi_date_model.feature_collection, name="AOI")
+            if self.selected_alerts_model.alert_hotspots is not None:
+                add_hotspot_layer(
+                    self.map_1,
+                    self.selected_alerts_model.alert_hotspots,
+                    cm.overview_tile.hotspot_layer_name,
+                )
            
             color_dictionary = {
                 "Not reviewed": "lightgrey",
@@ -181,3 +222,54 @@ class OverviewTile(sw.Layout):
         self.app_tile_model.current_page_view = "analysis_tile"
         widget.loading = False  # Remove loading state
         widget.disabled = False  # Re-enable the button
+
+    def on_map_click(self, **kwargs):
+        # Select the clicked hotspot cell and ask before replacing the alert list
+        if kwargs.get("type") != "click" or not self.hotspot_switch.v_model:
+            return
+        hotspots = self.selected_alerts_model.alert_hotspots
+        if hotspots is None or self.selected_alerts_model.extraction_params is None:
+            return
+        lat, lon = kwargs.get("coordinates")
+        cell = get_hotspot_cell(hotspots, lon, lat)
+        if cell is None:
+            return
+        self.hotspot_cell = cell
+        self.hotspot_alert.add_msg(
+            cm.overview_tile.hotspot_confirm.format(
+                round(cell["properties"]["area_ha"], 1)
+            ),
+            "warning",
+        )
+        self.hotspot_confirm_btn.show()
+        self.hotspot_cancel_btn.show()
+
+    def cancel_hotspot_cell(self, widget, event, data):
+        self.hotspot_cell = None
+        self.hotspot_confirm_btn.hide()
+        self.hotspot_cancel_btn.hide()
+        self.hotspot_alert.hide()
+
+    def extract_hotspot_cell(self, widget, event, data):
+        # Extract the alerts of the selected hotspot cell only
+        cell = self.hotspot_cell
+        if cell is None:
+            return
+        # The alerts of a full extraction still running are dropped
+        self.selected_alerts_model.extraction_generation += 1
+        generation = self.selected_alerts_model.extraction_generation
+        bounds = get_hotspot_bounds(cell)
+        print(f"Extracting the alerts of hotspot cell {bounds}")
+        features = obtener_datos_gee_adaptive(
+            **self.selected_alerts_model.extraction_params, cells=[bounds]
+        )
+        if generation != self.selected_alerts_model.extraction_generation:
+            return
+        self.selected_alerts_model.alerts_total_bbs = features
+        self.selected_alerts_model.received_alerts = "Yes"
+        self.hotspot_cell = None
+        self.hotspot_confirm_btn.hide()
+        self.hotspot_cancel_btn.hide()
+        self.hotspot_alert.add_msg(
+            cm.overview_tile.hotspot_done.format(len(features)), "success"
+        )